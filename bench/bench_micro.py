@@ -0,0 +1,120 @@
+"""
+Micro-benchmarks for the CPU-bound steps of a command: parse_stats,
+parse_history, build_embed, build_history_embeds and reading a leaderboard image.
+
+Player steps run on every recorded payload in bench/payloads. Images are
+generated scoreboards, or pass your own screenshots with --images.
+extract_names_from_image needs easyocr; without it only the image
+preprocessing (load_image + find_name_boxes) is timed.
+Usage: python bench/bench_micro.py [--number 500] [--images a.png b.png]
+"""
+import io
+import sys
+import timeit
+import argparse
+from pathlib import Path
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import ocr
+from main import parse_stats, parse_history, build_embed, build_history_embeds, render_embed, render_history_page, Player, HISTORY_PAGE_SIZE
+
+PAYLOADS = ROOT / "bench" / "payloads"
+
+SAMPLE_NAMES = [
+    "pvc", "s1natraa", "Lunar Tide", "xX_Groot_Xx", "MoonKnight42", "Hela.Main",
+    "Storm-Chaser", "NamorNation", "PeniPower", "jeffthefish", "Warlock", "IronFistBump",
+]
+
+
+def make_leaderboard_image(names: list = SAMPLE_NAMES, width: int = 1920, height: int = 1080) -> bytes:
+    """
+    A PNG laid out like the end of match scoreboard: a rank column, a
+    left-aligned name column and a few columns of numbers, light on dark.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    image = Image.new("RGB", (width, height), (18, 22, 34))
+    draw = ImageDraw.Draw(image)
+    row_height = height * 0.8 / len(names)
+    try:
+        font = ImageFont.load_default(size=int(row_height * 0.45))
+    except TypeError:
+        # Pillow built without FreeType only has a fixed-size bitmap font
+        font = ImageFont.load_default()
+    draw.text((width * 0.1, height * 0.04), "MATCH RESULTS", fill=(230, 230, 230), font=font)
+    for i, name in enumerate(names):
+        y = height * 0.12 + i * row_height
+        draw.rectangle((width * 0.05, y, width * 0.95, y + row_height * 0.85), fill=(28, 34, 52))
+        draw.text((width * 0.07, y + row_height * 0.2), str(i + 1), fill=(200, 200, 200), font=font)
+        draw.text((width * 0.15, y + row_height * 0.2), name, fill=(240, 240, 240), font=font)
+        for column, value in enumerate((12 + i, 3 + i % 5, 7 + i % 9, 1000 * (i + 3))):
+            draw.text((width * (0.5 + column * 0.1), y + row_height * 0.2), str(value), fill=(200, 200, 200), font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def report(label: str, func, number: int):
+    per_call = timeit.timeit(func, number=number) / number
+    print(f"  {label:<34} {per_call * 1e6:10.1f}µs  {1 / per_call:12,.0f}/s")
+
+
+def bench_players(number: int):
+    for path in sorted(PAYLOADS.glob("player*.json")):
+        data = orjson.loads(path.read_bytes())
+        player = Player.from_payload(data)
+        results = parse_stats(player)
+        history = parse_history(player)
+        print(f"{path.name} ({len(player.matches)} matches, {len(player.heroes)} heroes)")
+        report("Player.from_payload", lambda: Player.from_payload(data), number)
+        report("parse_stats", lambda: parse_stats(player), number)
+        report("parse_history", lambda: parse_history(player), number)
+        # build_* are served from the embed cache after the first call
+        report("build_embed", lambda: build_embed(results), number)
+        report("build_history_embeds (page 1)", lambda: build_history_embeds(history), number)
+        report("render_embed (uncached)", lambda: render_embed(results), number)
+        report("render_history_page (uncached)", lambda: render_history_page(history[:HISTORY_PAGE_SIZE]), number)
+
+
+def bench_images(images: list, number: int):
+    try:
+        import easyocr
+    except ImportError:
+        easyocr = None
+        print("easyocr is not installed, only timing the image preprocessing.")
+    else:
+        ocr.init_worker(["en"])
+
+    for label, image_data in images:
+        gray = ocr.load_image(image_data)
+        boxes = ocr.find_name_boxes(gray)
+        print(f"{label} ({len(image_data) / 1024:.0f}KB, {len(boxes or [])} name boxes found)")
+        report("load_image", lambda: ocr.load_image(image_data), number)
+        report("find_name_boxes", lambda: ocr.find_name_boxes(gray), number)
+        if easyocr is not None:
+            # Recognition is far slower than everything else, a few runs are enough
+            runs = max(1, number // 100)
+            report("extract_names_from_image", lambda: ocr.extract_names_from_image(image_data), runs)
+            print(f"  read: {ocr.extract_names_from_image(image_data)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=500, help="calls timed per step")
+    parser.add_argument("--images", nargs="*", type=Path, help="leaderboard screenshots to read")
+    args = parser.parse_args()
+
+    bench_players(args.number)
+    if args.images:
+        images = [(path.name, path.read_bytes()) for path in args.images]
+    else:
+        images = [
+            ("generated 1920x1080", make_leaderboard_image()),
+            ("generated 3840x2160", make_leaderboard_image(width=3840, height=2160)),
+        ]
+    bench_images(images, max(1, args.number // 10))
+
+
+if __name__ == "__main__":
+    main()
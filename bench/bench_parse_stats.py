@@ -0,0 +1,143 @@
+"""
+Micro-benchmark: parse_stats against the old pandas implementation.
+
+Runs both on every recorded payload in bench/payloads, checks that they give the
+same result and prints the time per call. The current version is timed including
+decoding the payload into a Player.
+Usage: python bench/bench_parse_stats.py [number of calls]
+pandas is only needed for the comparison (pip install pandas).
+"""
+import sys
+import timeit
+from pathlib import Path
+from collections import Counter
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from main import parse_stats, Player, PrivateProfileException
+
+PAYLOADS = ROOT / "bench" / "payloads"
+
+
+def legacy_parse_stats(data: dict) -> dict:
+    """
+    parse_stats as it was before pandas was dropped, kept for comparison.
+    """
+    import pandas as pd
+    if not data or data.get("is_profile_private") is True or not data.get("match_history"):
+        player_rank = data.get("stats", {}).get("rank", {}).get("rank")
+        if player_rank:
+            raise PrivateProfileException(player_rank)
+        else:
+            return {"Private": "true"}
+
+    username = data.get("player_name")
+    rank = data["stats"]["rank"]["rank"]
+    ranked_stats = data["stats"]["ranked"]
+    total_ranked_matches = ranked_stats["total_matches"]
+    total_ranked_wins = ranked_stats["total_wins"]
+    overall_winrate = round(
+        (total_ranked_wins / total_ranked_matches) * 100, 2
+    ) if total_ranked_matches > 0 else 0
+
+    hero_stats = data["hero_stats"]
+    hero_data = []
+    for stats in hero_stats.values():
+        ranked = stats.get("ranked")
+        if ranked:
+            hero_data.append({
+                "Hero": stats["hero_name"],
+                "Matches": ranked.get("matches", 0),
+                "Wins": ranked.get("wins", 0),
+                "Losses": ranked.get("matches", 0) - ranked.get("wins", 0),
+                "Win Rate (%)": round(
+                    (ranked.get("wins", 0) / ranked.get("matches", 1)) * 100, 2
+                ) if ranked.get("matches", 0) > 0 else 0,
+                "K/D Ratio": float(ranked.get("kdr", 0.0)),
+                "MVPs": ranked.get("mvp", 0),
+            })
+
+    hero_df = pd.DataFrame(hero_data).fillna({'Matches': 0}).sort_values(
+        by="Matches", ascending=False
+    )
+    top_3_heroes = hero_df.head(3)
+
+    match_history = data.get("match_history", [])
+    recent_wins = Counter()
+    recent_games = Counter()
+    for match in match_history:
+        hero_id = str(match["stats"]["hero"]["id"])
+        if hero_id in hero_stats:
+            hero_name = hero_stats[hero_id]["hero_name"]
+            recent_games[hero_name] += 1
+            if match["stats"]["is_win"]:
+                recent_wins[hero_name] += 1
+
+    recent_hero_data = [
+        {
+            "Hero": hero,
+            "Matches in Recent History": count,
+            "Win Rate (%)": round((recent_wins[hero] / count) * 100, 2) if count > 0 else 0
+        }
+        for hero, count in recent_games.items()
+    ]
+
+    recent_hero_df = pd.DataFrame(recent_hero_data).sort_values(
+        by="Matches in Recent History", ascending=False
+    ).head(5)
+
+    recent_matches = len(match_history)
+    recent_winrate = round((sum(recent_wins.values()) / recent_matches) * 100, 2) if recent_matches > 0 else 0
+
+    return {
+        "Username": username,
+        "Private": "false",
+        "Rank": rank,
+        "Overall Ranked Stats": {
+            "Total Ranked Matches": total_ranked_matches,
+            "Total Wins": total_ranked_wins,
+            "Overall Win Rate (%)": overall_winrate,
+        },
+        "Top 3 Most Played Heroes in Ranked": top_3_heroes.to_dict(orient="records"),
+        "Recently Played Heroes": recent_hero_df.to_dict(orient="records"),
+        "Recent Matches Win Rate (%)": recent_winrate,
+    }
+
+
+def same_result(a: dict, b: dict) -> bool:
+    """
+    Compare two parse_stats results. pandas' default sort isn't stable, so heroes
+    with the same number of matches may come back in either order.
+    """
+    def normalised(results):
+        results = dict(results)
+        for key in ("Top 3 Most Played Heroes in Ranked", "Recently Played Heroes"):
+            if key in results:
+                results[key] = sorted(results[key], key=lambda hero: (-list(hero.values())[1], hero["Hero"]))
+        return results
+    return normalised(a) == normalised(b)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    try:
+        import pandas
+    except ImportError:
+        pandas = None
+        print("pandas is not installed, only timing the current parse_stats.")
+
+    for path in sorted(PAYLOADS.glob("player*.json")):
+        data = orjson.loads(path.read_bytes())
+        current = timeit.timeit(lambda: parse_stats(Player.from_payload(data)), number=number) / number
+        line = f"{path.name:<20} parse_stats: {current * 1e6:8.1f}µs"
+        if pandas is not None:
+            if not same_result(legacy_parse_stats(data), parse_stats(Player.from_payload(data))):
+                print(f"{path.name}: results differ from the pandas implementation!")
+            legacy = timeit.timeit(lambda: legacy_parse_stats(data), number=number) / number
+            line += f"   pandas: {legacy * 1e6:8.1f}µs   speedup: {legacy / current:5.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Just enough of discord.py's Context, Message and Attachment to run the bot's
+command callbacks without a Discord connection. Everything sent or edited is
+recorded so benchmarks can check what the user would have seen.
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", content: str | None = None, embeds: list | None = None,
+                 view=None, attachments: list | None = None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds or []
+        self.view = view
+        self.attachments = attachments or []
+        self.edits = 0
+        self.deleted = False
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.channel.latency)
+        self.edits += 1
+        if "content" in kwargs:
+            self.content = kwargs["content"]
+        if "embed" in kwargs:
+            self.embeds = [kwargs["embed"]] if kwargs["embed"] is not None else []
+        if "embeds" in kwargs:
+            self.embeds = kwargs["embeds"]
+        if "view" in kwargs:
+            self.view = kwargs["view"]
+        return self
+
+    async def delete(self):
+        await asyncio.sleep(self.channel.latency)
+        self.deleted = True
+
+
+class FakeChannel:
+    """
+    latency is added to every send and edit, like a round trip to Discord.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.id = next(_ids)
+        self.latency = latency
+        self.messages = []
+
+    async def send(self, content: str | None = None, *, embed=None, embeds=None, view=None, **kwargs) -> FakeMessage:
+        await asyncio.sleep(self.latency)
+        message = FakeMessage(self, content, [embed] if embed is not None else embeds, view)
+        self.messages.append(message)
+        return message
+
+
+class FakeAttachment:
+    def __init__(self, data: bytes, content_type: str = "image/png", filename: str = "leaderboard.png"):
+        self.data = data
+        self.content_type = content_type
+        self.filename = filename
+        self.size = len(data)
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeContext:
+    """
+    Stand-in for commands.Context: ctx.send goes to a FakeChannel and
+    ctx.message carries the attachments of the invoking message.
+    """
+    def __init__(self, channel: FakeChannel | None = None, attachments: list | None = None,
+                 user_id: int | None = None, guild_id: int | None = None):
+        self.channel = channel or FakeChannel()
+        self.author = SimpleNamespace(id=user_id or next(_ids), bot=False)
+        self.guild = SimpleNamespace(id=guild_id or next(_ids))
+        self.message = FakeMessage(self.channel, attachments=attachments)
+        self.message.author = self.author
+        self.message.guild = self.guild
+        self.interaction = None
+
+    async def send(self, content: str | None = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeOCR:
+    """
+    Replaces the OCR worker pool: returns the given names after `delay` seconds.
+    """
+    def __init__(self, names: list, delay: float = 0.0):
+        self.names = names
+        self.delay = delay
+
+    async def extract_names(self, image_data: bytes) -> list:
+        await asyncio.sleep(self.delay)
+        return list(self.names)
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,191 @@
+"""
+Load test: runs the stats, history and leaderboard commands through a fake
+Discord context against the mock MR API, at several concurrency levels, and
+reports p50/p95/p99 latency per command and commands per second.
+
+Nothing leaves the machine: MR API is bench/mock_api.py and Discord is
+bench/fake_discord.py. OCR is replaced by FakeOCR unless --real-ocr is given
+(which needs easyocr). Every level starts with empty caches.
+Usage: python bench/load_test.py [--concurrency 1 8 32] [--commands 200] [--api-latency 0.05]
+"""
+import sys
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+import main as rivalsx
+from mock_api import MockMRApi
+from fake_discord import FakeContext, FakeChannel, FakeAttachment, FakeOCR
+from bench_micro import make_leaderboard_image
+
+# A command counts as failed if anything it sent contains one of these
+ERROR_MARKERS = ("error", "failed", "too many", "too long")
+
+
+async def run_stats(ctx: FakeContext, name: str):
+    await rivalsx.stats.callback(ctx, name=name)
+
+async def run_history(ctx: FakeContext, name: str):
+    await rivalsx.history.callback(ctx, name=name)
+
+async def run_leaderboard(ctx: FakeContext, name: str):
+    await rivalsx.leaderboard.callback(ctx)
+
+COMMANDS = {"stats": run_stats, "history": run_history, "leaderboard": run_leaderboard}
+
+
+def percentile(values: list, p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        command, _, weight = part.partition("=")
+        if command not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"unknown command {command!r}, expected one of {', '.join(COMMANDS)}")
+        mix[command] = float(weight or 1)
+    return mix
+
+def plan_commands(args, names: list) -> list:
+    """
+    The same random sequence of (command, name) for every concurrency level.
+    """
+    rng = random.Random(args.seed)
+    commands = list(args.mix)
+    weights = [args.mix[command] for command in commands]
+    plan = []
+    for i in range(args.commands):
+        name = f"nobody_{i}" if rng.random() < args.miss_rate else rng.choice(names)
+        plan.append((rng.choices(commands, weights)[0], name))
+    return plan
+
+def failed(ctx: FakeContext) -> bool:
+    return any(
+        message.content and any(marker in message.content.lower() for marker in ERROR_MARKERS)
+        for message in ctx.channel.messages
+    )
+
+
+async def setup_bot(args, mock: MockMRApi):
+    """
+    Give the bot a fresh API client and caches, the way setup_hook would.
+    """
+    bot = rivalsx.bot
+    if bot.http_client is not None:
+        await bot.http_client.aclose()
+    bot.http_client = rivalsx.create_http_client()
+    cache = rivalsx.ResponseCache(rivalsx.CACHE_TTLS, rivalsx.CACHE_MAX_ENTRIES, rivalsx.CACHE_MAX_BYTES)
+    bot.api = rivalsx.MRApiClient(bot.http_client, cache=cache)
+    bot.prefetcher = rivalsx.PrefetchScheduler(bot.api)
+    rivalsx.embed_cache = rivalsx.EmbedCache(rivalsx.EMBED_CACHE_ENTRIES)
+    if not args.real_ocr:
+        bot.ocr = FakeOCR(mock.names[:args.leaderboard_size], args.ocr_delay)
+    data = await bot.api.get_heroes()
+    rivalsx.hero_meta = rivalsx.HeroMetadata(data, rivalsx.HeroMetadata.version_of(data), time.time())
+
+
+async def run_level(args, mock: MockMRApi, plan: list, image: bytes, concurrency: int):
+    await setup_bot(args, mock)
+    mock.requests.clear()
+    mock.errors.clear()
+    latencies = defaultdict(list)
+    failures = Counter()
+    commands = iter(plan)
+
+    async def worker():
+        # Workers share one iterator, so each command in the plan runs once
+        for command, name in commands:
+            attachments = [FakeAttachment(image)] if command == "leaderboard" else []
+            ctx = FakeContext(FakeChannel(args.discord_latency), attachments)
+            started = time.perf_counter()
+            try:
+                await COMMANDS[command](ctx, name)
+                ok = not failed(ctx)
+            except Exception as e:
+                print(f"{command} {name} raised {e!r}")
+                ok = False
+            latencies[command].append(time.perf_counter() - started)
+            failures[command] += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Let background refreshes finish so they don't spill into the next level
+    await asyncio.gather(*rivalsx.bot.background_tasks, return_exceptions=True)
+
+    print(
+        f"\nconcurrency {concurrency}: {len(plan)} commands in {elapsed:.2f}s, "
+        f"{len(plan) / elapsed:.1f} commands/s, {sum(failures.values())} failed, "
+        f"{sum(mock.requests.values())} API requests ({sum(mock.errors.values())} injected errors)"
+    )
+    print(f"  {'command':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(latencies.items()) + [("all", [value for values in latencies.values() for value in values])]
+    for command, values in rows:
+        values.sort()
+        print(
+            f"  {command:<12}{len(values):>7}"
+            + "".join(f"{percentile(values, p) * 1000:>10.1f}" for p in (50, 95, 99))
+            + f"{values[-1] * 1000:>10.1f}"
+        )
+
+
+async def run(args):
+    mock = MockMRApi(args.api_latency, args.api_jitter, args.error_rate, seed=args.seed, clones=args.players)
+    rivalsx.API_BASE_URL = await mock.start()
+    if args.rate_limit:
+        rivalsx.API_RATE_LIMIT = args.rate_limit
+        rivalsx.API_RATE_BURST = max(1, int(args.rate_limit))
+    plan = plan_commands(args, mock.names)
+    image = make_leaderboard_image(mock.names[:args.leaderboard_size])
+    print(
+        f"Mock API latency {args.api_latency * 1000:.0f}ms ±{args.api_jitter * 1000:.0f}ms, "
+        f"error rate {args.error_rate:.0%}, Discord latency {args.discord_latency * 1000:.0f}ms, "
+        f"{len(mock.names)} players, rate limit {rivalsx.API_RATE_LIMIT:g}/s"
+    )
+    try:
+        for concurrency in args.concurrency:
+            await run_level(args, mock, plan, image, concurrency)
+    finally:
+        if rivalsx.bot.http_client is not None:
+            await rivalsx.bot.http_client.aclose()
+        if rivalsx.bot.ocr is not None:
+            rivalsx.bot.ocr.shutdown()
+        await mock.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--commands", type=int, default=200, help="commands run per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default="stats=7,history=2,leaderboard=1",
+                        help="relative weight of each command")
+    parser.add_argument("--players", type=int, default=50, help="players served per recorded payload")
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="share of lookups for unknown players")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per mock API response")
+    parser.add_argument("--api-jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock API responses that are 503s")
+    parser.add_argument("--discord-latency", type=float, default=0.03, help="seconds per Discord send/edit")
+    parser.add_argument("--rate-limit", type=float, help="override API_RATE_LIMIT (requests per second)")
+    parser.add_argument("--leaderboard-size", type=int, default=6, help="players on the leaderboard image")
+    parser.add_argument("--ocr-delay", type=float, default=0.5, help="seconds FakeOCR takes per image")
+    parser.add_argument("--real-ocr", action="store_true", help="read the image with the real OCR pool")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+    logging.getLogger("rivalsx").setLevel(args.log_level.upper())
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Local stand-in for MR API, serving the recorded payloads in bench/payloads.
+
+Every player*.json payload is served under its player_name and player_uid.
+With --clones N each payload is also served as N-1 more players (name_1, name_2...)
+so load tests don't only hit the same few cached players.
+Latency and failures can be injected to see how the bot copes with a slow or
+broken upstream.
+Usage: python bench/mock_api.py [--port 8765] [--latency 0.05] [--error-rate 0.1] ...
+then start the bot with MR_API_BASE_URL=http://127.0.0.1:8765/api
+"""
+import sys
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from collections import Counter
+import orjson
+from aiohttp import web
+
+PAYLOADS = Path(__file__).resolve().parent / "payloads"
+
+
+class MockMRApi:
+    """
+    error_rate of the requests get a 503, slow_rate of them take slow_latency
+    seconds instead of latency (+/- jitter). down=True fails every request.
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 5.0, seed: int | None = None, clones: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = False
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.players = {}
+        self.ids = {}
+        for path in sorted(PAYLOADS.glob("player*.json")):
+            body = path.read_bytes()
+            data = orjson.loads(body)
+            for i in range(clones):
+                uid = str(data["player_uid"]) + (f"{i:04d}" if i else "")
+                name = data["player_name"] + (f"_{i}" if i else "")
+                self.players[uid] = body
+                self.ids[name.lower()] = {"id": uid, "name": name}
+        self.names = [data["name"] for data in self.ids.values()]
+        heroes = PAYLOADS / "heroes.json"
+        self.heroes = heroes.read_bytes() if heroes.exists() else b"[]"
+        self.runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/api/heroes", self.get_heroes)
+        self.app.router.add_get("/api/player-id/{name}", self.get_player_id)
+        self.app.router.add_get("/api/player-update/{uid}", self.update_player)
+        self.app.router.add_get("/api/player/{uid}", self.get_player)
+
+    async def _delay(self, endpoint: str) -> web.Response | None:
+        """
+        Sleep for the injected latency, returns an error response if this
+        request should fail.
+        """
+        self.requests[endpoint] += 1
+        if self.random.random() < self.slow_rate:
+            delay = self.slow_latency
+        else:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if self.down or self.random.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            return web.json_response({"error": True, "message": "Service unavailable"}, status=503)
+        return None
+
+    async def get_heroes(self, request: web.Request) -> web.Response:
+        return await self._delay("heroes") or web.Response(body=self.heroes, content_type="application/json")
+
+    async def get_player_id(self, request: web.Request) -> web.Response:
+        error = await self._delay("player-id")
+        if error is not None:
+            return error
+        data = self.ids.get(request.match_info["name"].lower())
+        if data is None:
+            return web.json_response({"error": True, "message": "Player not found"}, status=404)
+        return web.json_response(data)
+
+    async def update_player(self, request: web.Request) -> web.Response:
+        error = await self._delay("player-update")
+        if error is not None:
+            return error
+        if request.match_info["uid"] not in self.players:
+            return web.json_response({"success": False}, status=404)
+        return web.json_response({"success": True})
+
+    async def get_player(self, request: web.Request) -> web.Response:
+        error = await self._delay("player")
+        if error is not None:
+            return error
+        body = self.players.get(request.match_info["uid"])
+        if body is None:
+            return web.json_response({"error": True, "message": "Player not found"}, status=404)
+        return web.Response(body=body, content_type="application/json")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving, returns the base URL to use as MR_API_BASE_URL.
+        port=0 picks a free port.
+        """
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/api"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def serve(args):
+    api = MockMRApi(args.latency, args.jitter, args.error_rate, args.slow_rate, args.slow_latency, args.seed, args.clones)
+    url = await api.start(args.host, args.port)
+    print(f"Mock MR API serving {len(api.players)} players at {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds on top of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--clones", type=int, default=1, help="players served per recorded payload")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
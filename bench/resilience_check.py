@@ -0,0 +1,135 @@
+"""
+Checks MRApiClient's retries, circuit breaker and hedged requests against the
+local mock API (bench/mock_api.py), no network or Discord token needed.
+Usage: python bench/resilience_check.py
+Exits with status 1 if any scenario fails.
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+import main
+from main import MRApiClient, CircuitBreaker, UpstreamUnavailableException, CircuitOpenException
+from mock_api import MockMRApi
+
+PLAYER = "pvc"
+
+
+async def new_client(mock: MockMRApi, threshold: int = 3, reset_timeout: float = 0.5) -> MRApiClient:
+    main.API_BASE_URL = await mock.start()
+    api = MRApiClient(httpx.AsyncClient(timeout=2.0))
+    api.breaker = CircuitBreaker(threshold, reset_timeout)
+    return api
+
+
+async def check_retries():
+    """
+    A third of the requests fail, every lookup should still succeed.
+    """
+    mock = MockMRApi(error_rate=0.3, seed=1)
+    api = await new_client(mock, threshold=100)
+    try:
+        for _ in range(10):
+            user_id = (await api.get_player_id(PLAYER))["id"]
+            await api.get_player_stats(user_id, fresh=True)
+        assert sum(mock.errors.values()) > 0, "no errors were injected"
+        return f"{sum(mock.errors.values())} injected errors retried"
+    finally:
+        await api.client.aclose()
+        await mock.stop()
+
+
+async def check_circuit_breaker():
+    """
+    While the API is down the circuit opens, requests fail fast and cached stats
+    are served. Once it's back the trial request closes the circuit.
+    """
+    mock = MockMRApi()
+    api = await new_client(mock)
+    try:
+        user_id = (await api.get_player_id(PLAYER))["id"]
+        cached = await api.get_player_stats(user_id)
+
+        mock.down = True
+        try:
+            await api.get_player_stats(user_id, fresh=True)
+            raise AssertionError("fresh stats were returned while the API was down")
+        except UpstreamUnavailableException:
+            pass
+        assert api.breaker.state == "open", f"circuit is {api.breaker.state}"
+
+        sent = sum(mock.requests.values())
+        started = time.perf_counter()
+        try:
+            await api.get_player_stats(user_id, fresh=True)
+            raise AssertionError("a request got through the open circuit")
+        except CircuitOpenException:
+            pass
+        assert time.perf_counter() - started < 0.05, "open circuit didn't fail fast"
+        assert sum(mock.requests.values()) == sent, "open circuit still called the API"
+        assert await api.get_player_stats(user_id) is cached, "cached stats weren't served"
+
+        mock.down = False
+        await asyncio.sleep(api.breaker.reset_timeout)
+        await api.get_player_stats(user_id, fresh=True)
+        assert api.breaker.state == "closed", f"circuit is {api.breaker.state} after recovering"
+        return f"{api.breaker.rejected} requests rejected while open"
+    finally:
+        await api.client.aclose()
+        await mock.stop()
+
+
+async def slow_lookups(hedge_delay: float) -> tuple[int, float]:
+    """
+    20 lookups against a mock where 30% of the responses take 0.5s.
+    Returns how many lookups were slow and the total time taken.
+    """
+    mock = MockMRApi(slow_rate=0.3, slow_latency=0.5, seed=2)
+    api = await new_client(mock, threshold=100)
+    main.API_HEDGE_DELAY = hedge_delay
+    try:
+        user_id = (await api.get_player_id(PLAYER))["id"]
+        slow = 0
+        total = 0.0
+        for _ in range(20):
+            started = time.perf_counter()
+            await api.get_player_stats(user_id, fresh=True)
+            elapsed = time.perf_counter() - started
+            slow += elapsed >= mock.slow_latency
+            total += elapsed
+        return slow, total
+    finally:
+        main.API_HEDGE_DELAY = 0
+        await api.client.aclose()
+        await mock.stop()
+
+
+async def check_hedging():
+    """
+    Hedging after 0.05s should leave fewer slow lookups than no hedging.
+    """
+    slow, total = await slow_lookups(0)
+    hedged_slow, hedged_total = await slow_lookups(0.05)
+    assert hedged_slow < slow, f"{hedged_slow} slow lookups with hedging, {slow} without"
+    return f"slow lookups {slow} -> {hedged_slow}, total {total:.2f}s -> {hedged_total:.2f}s"
+
+
+async def run():
+    failed = 0
+    for check in (check_retries, check_circuit_breaker, check_hedging):
+        try:
+            result = await check()
+            print(f"PASS {check.__name__}: {result}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL {check.__name__}: {type(e).__name__} {e}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run()) else 0)
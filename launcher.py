@@ -0,0 +1,154 @@
+"""
+Runs the bot as several worker processes, each connecting its own share of the
+Discord shards, and restarts any worker that dies.
+
+Workers share the response cache, the match store and the MR API rate limit
+through SQLite files in --data-dir, so they don't repeat each other's upstream
+calls. Each worker serves its metrics on METRICS_PORT + its cluster id.
+Usage: python launcher.py [--workers 2] [--shards N]
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import subprocess
+import httpx
+from dotenv import load_dotenv
+import metrics
+
+log = logging.getLogger("rivalsx.launcher")
+
+# A worker that stayed up this long is considered healthy again
+HEALTHY_AFTER = 300
+MAX_RESTART_DELAY = 60
+
+
+def recommended_shards(token: str) -> int:
+    """
+    Number of shards Discord recommends for this bot.
+    """
+    response = httpx.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()["shards"]
+
+def split_shards(shard_count: int, workers: int) -> list:
+    """
+    Shard ids per worker, as even as possible.
+    """
+    return [list(range(worker, shard_count, workers)) for worker in range(workers)]
+
+
+class Worker:
+    """
+    One bot process running a fixed set of shards.
+    """
+    def __init__(self, cluster_id: int, shard_ids: list, env: dict):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = env
+        self.process = None
+        self.started_at = 0.0
+        self.restart_delay = 1.0
+        self.restart_at = None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, "main.py"], env=self.env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        log.info(f"Started cluster {self.cluster_id} (pid {self.process.pid}) with shards {self.shard_ids}")
+
+    def check(self):
+        """
+        Schedule a restart if the process exited, with a backoff that doubles
+        while it keeps crashing.
+        """
+        if self.restart_at is not None:
+            if time.monotonic() >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        if time.monotonic() - self.started_at >= HEALTHY_AFTER:
+            self.restart_delay = 1.0
+        log.warning(f"Cluster {self.cluster_id} exited with code {code}, restarting in {self.restart_delay:.0f}s")
+        self.restart_at = time.monotonic() + self.restart_delay
+        self.restart_delay = min(MAX_RESTART_DELAY, self.restart_delay * 2)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout: float):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            log.warning(f"Cluster {self.cluster_id} didn't stop in time, killing it")
+            self.process.kill()
+
+
+def main():
+    load_dotenv()
+    metrics.setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "text").lower() == "json", "launcher")
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2, help="bot processes to run")
+    parser.add_argument("--shards", type=int, help="total shards, asks Discord for its recommendation if not given")
+    parser.add_argument("--data-dir", default=".", help="where the shared SQLite files go")
+    args = parser.parse_args()
+
+    shard_count = args.shards or recommended_shards(os.getenv("DISCORD_TOKEN"))
+    workers = min(args.workers, shard_count)
+    base_metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+    log.info(f"Running {shard_count} shards across {workers} workers")
+
+    # Workers run from the repo directory, so a relative --data-dir is resolved here
+    data_dir = os.path.abspath(args.data_dir)
+    shared = {
+        "CACHE_DB_PATH": os.path.join(data_dir, "cache.db"),
+        "MATCH_DB_PATH": os.path.join(data_dir, "matches.db"),
+        "NAME_DB_PATH": os.path.join(data_dir, "names.db"),
+        "RATE_LIMIT_DB_PATH": os.path.join(data_dir, "ratelimit.db"),
+        "HERO_SNAPSHOT_PATH": os.path.join(data_dir, "heroes_snapshot.json"),
+    }
+    pool = []
+    for cluster_id, shard_ids in enumerate(split_shards(shard_count, workers)):
+        env = {**shared, **os.environ}
+        env.update({
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+            "CLUSTER_ID": str(cluster_id),
+            "METRICS_PORT": str(base_metrics_port + cluster_id if base_metrics_port else 0),
+        })
+        pool.append(Worker(cluster_id, shard_ids, env))
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for worker in pool:
+        worker.start()
+    while not stopping:
+        time.sleep(1)
+        for worker in pool:
+            worker.check()
+
+    log.info("Stopping workers")
+    for worker in pool:
+        worker.stop()
+    for worker in pool:
+        worker.wait(15)
+
+
+if __name__ == "__main__":
+    main()
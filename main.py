@@ -1,47 +1,319 @@
+import time
+STARTED_AT = time.perf_counter()
 import os
-import re
-import io
-import cv2
+import sys
+import asyncio
+import math
+import random
+import sqlite3
+import threading
+import email.utils
+import difflib
+import heapq
+import bisect
+import hashlib
+import itertools
+import contextvars
+import logging
 import httpx
 import orjson
 import discord
 import urllib.parse
-import numpy as np
-import pandas as pd
-from PIL import Image
 from dotenv import load_dotenv
-from datetime import datetime
-from collections import Counter
-from discord.ext import commands
-import easyocr
-reader = easyocr.Reader(["en", "de", "es", "sv", "fr"], gpu=False)
+from datetime import datetime, UTC
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from discord import app_commands
+from discord.ext import commands, tasks
+from ocr import OCRPool, OCRBusyException, OCRTimeoutException, OCRWorkerCrashException
+import metrics
+
+load_dotenv()
+
+# Point this at a local mock server (see bench/mock_api.py) to test without mrapi.org
+API_BASE_URL = os.getenv("MR_API_BASE_URL", "https://mrapi.org/api").rstrip("/")
+
+# Upstream HTTP settings, can be overridden from the .env file
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_UPDATE_TIMEOUT = float(os.getenv("HTTP_UPDATE_TIMEOUT", "20"))
+API_MAX_IN_FLIGHT = int(os.getenv("API_MAX_IN_FLIGHT", "16"))
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "10"))
+API_RATE_BURST = int(os.getenv("API_RATE_BURST", "20"))
+API_MAX_429_RETRIES = int(os.getenv("API_MAX_429_RETRIES", "3"))
+# SQLite file holding the rate limit state, so processes sharing it share one
+# API_RATE_LIMIT. Unset, every process has its own limit.
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH")
+# After this many failed requests in a row MR API is considered down, and requests
+# fail fast (or are answered from the cache) for CIRCUIT_RESET_TIMEOUT seconds
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+# Send a second get_player_stats request if the first hasn't answered after this
+# many seconds, and use whichever answers first. 0 disables hedging.
+API_HEDGE_DELAY = float(os.getenv("API_HEDGE_DELAY", "0"))
+LEADERBOARD_CONCURRENCY = int(os.getenv("LEADERBOARD_CONCURRENCY", "6"))
+# Most players r.compare puts side by side
+COMPARE_MAX_PLAYERS = int(os.getenv("COMPARE_MAX_PLAYERS", "6"))
+# Messages sent to one channel are paced to Discord's per-channel bucket (a burst
+# of DISCORD_SEND_BURST, then DISCORD_SEND_RATE per second) instead of hitting 429s
+DISCORD_SEND_RATE = float(os.getenv("DISCORD_SEND_RATE", "1"))
+DISCORD_SEND_BURST = int(os.getenv("DISCORD_SEND_BURST", "5"))
+# Admission control. Every user and guild may run a few commands at once and send
+# so many per minute: commands over the concurrency limit wait in line (at most
+# USER_MAX_QUEUED per user), commands over the rate are turned away.
+USER_MAX_CONCURRENT = int(os.getenv("USER_MAX_CONCURRENT", "2"))
+USER_MAX_QUEUED = int(os.getenv("USER_MAX_QUEUED", "3"))
+USER_COMMANDS_PER_MINUTE = float(os.getenv("USER_COMMANDS_PER_MINUTE", "20"))
+USER_COMMAND_BURST = int(os.getenv("USER_COMMAND_BURST", "5"))
+GUILD_MAX_CONCURRENT = int(os.getenv("GUILD_MAX_CONCURRENT", "8"))
+GUILD_COMMANDS_PER_MINUTE = float(os.getenv("GUILD_COMMANDS_PER_MINUTE", "120"))
+GUILD_COMMAND_BURST = int(os.getenv("GUILD_COMMAND_BURST", "20"))
+# Commands reading images share this many slots, so they can't crowd out quick lookups
+EXPENSIVE_MAX_CONCURRENT = int(os.getenv("EXPENSIVE_MAX_CONCURRENT", "4"))
+# MR API request slots player updates may hold at once, lookups get free slots first
+API_SLOW_LANE_SLOTS = int(os.getenv("API_SLOW_LANE_SLOTS", "4"))
+# Relative share of MR API capacity per guild, e.g. "1234:2,5678:0.5". Unlisted guilds weigh 1.
+GUILD_WEIGHTS = {
+    int(guild): float(weight)
+    for guild, _, weight in (part.partition(":") for part in os.getenv("GUILD_WEIGHTS", "").split(","))
+    if weight
+}
+
+# OCR worker pool used by r.leaderboard. OCR_ENABLED=false runs a stats-only
+# instance that never imports torch/easyocr.
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_PRELOAD = os.getenv("OCR_PRELOAD", "false").lower() == "true"
+OCR_LANGUAGES = [lang.strip() for lang in os.getenv("OCR_LANGUAGES", "en,de,es,sv,fr").split(",") if lang.strip()]
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "8"))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_NAME_MATCH_CUTOFF = float(os.getenv("OCR_NAME_MATCH_CUTOFF", "0.8"))
+
+# Matches shown per page of r.history, Discord allows at most 10 embeds per message
+HISTORY_PAGE_SIZE = max(1, min(10, int(os.getenv("HISTORY_PAGE_SIZE", "5"))))
+
+# Background refresh of the most looked up players
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "60"))
+PREFETCH_CALLS_PER_MINUTE = int(os.getenv("PREFETCH_CALLS_PER_MINUTE", "30"))
+# Each interval, every player's score is multiplied by this so old favourites fade out
+PREFETCH_DECAY = float(os.getenv("PREFETCH_DECAY", "0.95"))
+# Only players scoring at least this are kept warm, one lookup alone never qualifies
+PREFETCH_MIN_SCORE = float(os.getenv("PREFETCH_MIN_SCORE", "1.5"))
+
+# Response cache settings. TTLs are in seconds, one per MR API endpoint.
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Decoded players kept in memory, each counted at the size of its JSON payload
+# (measured to be more than the decoded objects take)
+PLAYER_CACHE_MAX_BYTES = int(os.getenv("PLAYER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Rendered embeds kept to answer unchanged stats and history pages without rebuilding them
+EMBED_CACHE_ENTRIES = int(os.getenv("EMBED_CACHE_ENTRIES", "1000"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")
+# Every match the bot sees is kept here for r.trends, set to an empty value to disable
+MATCH_DB_PATH = os.getenv("MATCH_DB_PATH", "matches.db")
+# Every name ever resolved, for lookups, typo correction and autocomplete without
+# calling MR API. Empty keeps the index in memory only.
+NAME_DB_PATH = os.getenv("NAME_DB_PATH", "names.db")
+# Names resolved within this many seconds are answered from the index
+NAME_INDEX_MAX_AGE = float(os.getenv("NAME_INDEX_MAX_AGE", "604800"))
+CACHE_TTLS = {
+    "player-id": float(os.getenv("CACHE_TTL_PLAYER_ID", "21600")),
+    "player": float(os.getenv("CACHE_TTL_PLAYER", "60")),
+}
+# Hero metadata is loaded from this file at startup and refreshed on a schedule
+HERO_SNAPSHOT_PATH = os.getenv("HERO_SNAPSHOT_PATH", "heroes_snapshot.json")
+HERO_REFRESH_INTERVAL = float(os.getenv("HERO_REFRESH_INTERVAL", "21600"))
+# Until hero data was fetched once, a failed fetch is retried after this many seconds, doubling each time
+HERO_RETRY_INTERVAL = float(os.getenv("HERO_RETRY_INTERVAL", "30"))
+# Skip update_player when the player was refreshed less than this many seconds ago
+PLAYER_UPDATE_INTERVAL = float(os.getenv("PLAYER_UPDATE_INTERVAL", "600"))
+# Decoded players are kept this long to answer instantly while a refresh runs
+PLAYER_STALE_MAX_AGE = float(os.getenv("PLAYER_STALE_MAX_AGE", "86400"))
+# Sharding, normally set by launcher.py: SHARD_COUNT shards in total, of which this
+# process runs SHARD_IDS (comma separated). Unset, discord.py picks the shard
+# count and this process runs every shard.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(shard) for shard in os.getenv("SHARD_IDS", "").split(",") if shard.strip()] or None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+# Logs go to stderr, LOG_FORMAT=json for one JSON object per line
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Prometheus metrics are served on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+metrics.setup_logging(LOG_LEVEL, LOG_FORMAT == "json", f"cluster {CLUSTER_ID}" if SHARD_IDS else None)
+# httpx logs every request at INFO, the API metrics already cover that
+logging.getLogger("httpx").setLevel(logging.WARNING)
+log = logging.getLogger("rivalsx")
+
+API_SECONDS = metrics.Histogram("rivalsx_api_request_seconds", "MR API request latency per attempt", ["endpoint"])
+API_REQUESTS = metrics.Counter("rivalsx_api_requests_total", "MR API requests by status code or error", ["endpoint", "result"])
+API_IN_FLIGHT = metrics.Gauge("rivalsx_api_in_flight", "MR API requests currently running")
+API_CIRCUIT_OPEN = metrics.Gauge("rivalsx_api_circuit_open", "1 while the MR API circuit breaker is open")
+API_COLLAPSED = metrics.Counter("rivalsx_api_collapsed_total", "Lookups that shared another lookup's request", ["endpoint"])
+CACHE_LOOKUPS = metrics.Counter("rivalsx_cache_lookups_total", "Cache lookups by result", ["namespace", "result"])
+CACHE_MEMORY_BYTES = metrics.Gauge("rivalsx_cache_memory_bytes", "Size of the responses cached in memory")
+STAGE_SECONDS = metrics.Histogram("rivalsx_stage_seconds", "Time spent in each stage of handling a command", ["stage"])
+COMMAND_SECONDS = metrics.Histogram("rivalsx_command_seconds", "Time from invoking a command to it returning", ["command"])
+COMMANDS_IN_FLIGHT = metrics.Gauge("rivalsx_commands_in_flight", "Commands currently being handled")
+ERRORS = metrics.Counter("rivalsx_errors_total", "Unexpected errors by where they happened", ["source"])
+ADMISSION_QUEUED = metrics.Gauge("rivalsx_admission_queue_depth", "Commands waiting in line to start", ["lane"])
+ADMISSION_WAIT_SECONDS = metrics.Histogram("rivalsx_admission_wait_seconds", "Time commands waited in line", ["lane"])
+ADMISSION_REJECTED = metrics.Counter("rivalsx_admission_rejected_total", "Commands turned away by admission control", ["reason"])
+API_QUEUED = metrics.Gauge("rivalsx_api_queue_depth", "MR API requests waiting for a slot", ["lane"])
+
+# Guild the current command came from, MR API slots are shared fairly between guilds.
+# Tasks started while handling a command inherit it.
+request_guild = contextvars.ContextVar("request_guild", default="background")
+
+
+class LRUCache:
+    """
+    In-memory LRU cache with a TTL per entry.
+    Bounded by number of entries and, optionally, by the total size of the values.
+    """
+    def __init__(self, max_entries: int, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float, size: int = 0):
+        self.pop(key)
+        self._data[key] = (time.monotonic() + ttl, size, value)
+        self.size += size
+        while len(self._data) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self.size -= old_size
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self.size -= entry[1]
+        return entry[2]
+
+
+class SQLiteCache:
+    """
+    On-disk cache backend so cached responses survive restarts.
+    """
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self.conn.commit()
+
+    def get(self, namespace: str, key: str) -> tuple[bytes, float] | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return row
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires_at),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
 
-intents = discord.Intents.default()
-intents.message_content = True
 
-bot = commands.Bot(command_prefix='r.', intents=intents)
-
-API_BASE_URL = "https://mrapi.org/api"
-
-async def fetch_hero_data():
-    async with httpx.AsyncClient() as client:
-        heroes = []
-        ids_heroes = {}
-        heroes_icons = {}
-        url = f"{API_BASE_URL}/heroes"
-        response = await client.get(url)
-        if response.status_code == 200:
-            data = orjson.loads(response.content)
-            for hero in data:
-                heroes.append(hero["name"])
-                ids_heroes[hero["id"]] = hero["name"]
-                heroes_icons[hero["name"]] = hero["transformations"][0]["icon"]
+class ResponseCache:
+    """
+    Two-tier cache for raw MR API response bodies.
+    Memory is checked first, then the optional SQLite file. Each namespace
+    (one per endpoint) has its own TTL, and hits/misses are counted per namespace.
+    memory=False keeps a response on disk only, for callers that keep their own
+    decoded copy in memory. get_entry also says when a response was fetched.
+    """
+    def __init__(self, ttls: dict, max_entries: int, max_bytes: int | None = None, db_path: str | None = None):
+        self.ttls = ttls
+        self.memory = LRUCache(max_entries, max_bytes)
+        self.disk = SQLiteCache(db_path) if db_path else None
+        self.hits = Counter()
+        self.misses = Counter()
+
+    async def get(self, namespace: str, key: str, memory: bool = True) -> bytes | None:
+        entry = await self.get_entry(namespace, key, memory)
+        return entry[0] if entry is not None else None
+
+    async def get_entry(self, namespace: str, key: str, memory: bool = True) -> tuple[bytes, float] | None:
+        """
+        (response, time.time() it was fetched at), possibly by another process.
+        """
+        entry = self.memory.get((namespace, key)) if memory else None
+        if entry is None and self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, namespace, key)
+            if row is not None:
+                value, expires_at = row
+                entry = (value, expires_at - self.ttls[namespace])
+                if memory:
+                    self.memory.set((namespace, key), entry, expires_at - time.time(), len(value))
+        if entry is None:
+            self.misses[namespace] += 1
+            CACHE_LOOKUPS.labels(namespace, "miss").inc()
         else:
-            print(f"Failed to fetch hero data with status {response.status_code}")
-        
-        return(heroes, ids_heroes, heroes_icons)
+            self.hits[namespace] += 1
+            CACHE_LOOKUPS.labels(namespace, "hit").inc()
+        return entry
+
+    async def set(self, namespace: str, key: str, value: bytes, memory: bool = True):
+        ttl = self.ttls[namespace]
+        if memory:
+            self.memory.set((namespace, key), (value, time.time()), ttl, len(value))
+            CACHE_MEMORY_BYTES.set(self.memory.size)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, namespace, key, value, time.time() + ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "entries": len(self.memory),
+            "bytes": self.memory.size,
+            "evictions": self.memory.evictions,
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
 
-HEROES, IDS_HEROES, HEROES_ICONS = asyncio.run(fetch_hero_data())
 
 HEROES_COLORS = {
     "Bruce Banner": "#4A7A3D",
@@ -81,9 +353,94 @@ HEROES_COLORS = {
     "Iron Fist": "#32CD32"
 }
 
-for hero in HEROES:
-    if hero not in HEROES_COLORS:
-        HEROES_COLORS[hero] = "#000000"
+class HeroMetadata:
+    """
+    One version of the hero roster and its lookup tables.
+    Never modified after creation: a refresh builds a new one and swaps it in.
+    """
+    __slots__ = ("version", "fetched_at", "heroes", "ids_heroes", "icons", "colors", "colour_ints")
+
+    def __init__(self, data: list, version: str, fetched_at: float):
+        self.version = version
+        self.fetched_at = fetched_at
+        self.heroes = []
+        self.ids_heroes = {}
+        self.icons = {}
+        for hero in data:
+            self.heroes.append(hero["name"])
+            self.ids_heroes[hero["id"]] = hero["name"]
+            self.icons[hero["name"]] = hero["transformations"][0]["icon"]
+        self.colors = dict(HEROES_COLORS)
+        for hero in self.heroes:
+            if hero not in self.colors:
+                self.colors[hero] = "#000000"
+        # Parsed once here rather than on every embed
+        self.colour_ints = {hero: int(color.lstrip("#"), 16) for hero, color in self.colors.items()}
+
+    @staticmethod
+    def version_of(data: list) -> str:
+        return hashlib.sha1(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()[:12]
+
+
+def load_hero_snapshot(path: str = HERO_SNAPSHOT_PATH) -> HeroMetadata:
+    """
+    Load hero metadata from the local snapshot, or empty tables if there is none yet.
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = orjson.loads(f.read())
+        return HeroMetadata(snapshot["heroes"], snapshot["version"], snapshot["fetched_at"])
+    except FileNotFoundError:
+        log.info(f"No hero snapshot at {path}, hero data will be fetched once the bot starts")
+    except (OSError, orjson.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+        log.warning(f"Ignoring unreadable hero snapshot {path}: {e!r}")
+    return HeroMetadata([], "none", 0.0)
+
+
+def save_hero_snapshot(meta_data: list, version: str, fetched_at: float, path: str = HERO_SNAPSHOT_PATH):
+    """
+    Write the snapshot atomically, a crash mid-write never leaves a broken file.
+    The temporary file is per process, workers sharing the snapshot may save at once.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps({"version": version, "fetched_at": fetched_at, "heroes": meta_data}))
+    os.replace(tmp_path, path)
+
+
+hero_meta = load_hero_snapshot()
+
+@tasks.loop(seconds=HERO_REFRESH_INTERVAL)
+async def refresh_hero_data():
+    """
+    Fetch the hero roster and swap in the new tables if it changed.
+    With no tables at all yet (a fresh deploy without a snapshot) failures are
+    retried with a backoff instead of waiting a whole refresh interval.
+    """
+    global hero_meta
+    if time.time() - hero_meta.fetched_at < HERO_REFRESH_INTERVAL:
+        return
+    try:
+        data = await bot.api.get_heroes()
+        new_meta = HeroMetadata(data, HeroMetadata.version_of(data), time.time())
+    except Exception as e:
+        if hero_meta.heroes:
+            log.warning(f"Failed to refresh hero data, keeping version {hero_meta.version}: {e!r}")
+            return
+        retry = HERO_RETRY_INTERVAL if refresh_hero_data.seconds >= HERO_REFRESH_INTERVAL else refresh_hero_data.seconds * 2
+        retry = min(retry, HERO_REFRESH_INTERVAL)
+        log.warning(f"Failed to fetch hero data, retrying in {retry:.0f}s: {e!r}")
+        refresh_hero_data.change_interval(seconds=retry)
+        return
+    if refresh_hero_data.seconds != HERO_REFRESH_INTERVAL:
+        refresh_hero_data.change_interval(seconds=HERO_REFRESH_INTERVAL)
+    if new_meta.version != hero_meta.version:
+        log.info(f"Hero data updated from version {hero_meta.version} to {new_meta.version} ({len(new_meta.heroes)} heroes)")
+    hero_meta = new_meta
+    try:
+        await asyncio.to_thread(save_hero_snapshot, data, new_meta.version, new_meta.fetched_at)
+    except OSError as e:
+        log.warning(f"Failed to save hero snapshot: {e!r}")
 
 RANK_ICONS = {
     "Bronze": "<:1BronzeRank:1337210495085842504>",
@@ -96,23 +453,196 @@ RANK_ICONS = {
     "Eternity": "<:8EternityRank:1337210686786240512>",
     "One Above All": "<:9OneAboveAllRank:1337210689051299871>"
 }
+# Every rank string MR API sends ("Gold 2", "One Above All"...) to its icon
+RANK_ICON_LOOKUP = {
+    **RANK_ICONS,
+    **{f"{tier} {division}": icon for tier, icon in RANK_ICONS.items() for division in ("1", "2", "3")},
+}
+
+def rank_icon(rank: str | None) -> str:
+    """
+    Icon for a rank, "" if it's not one we know.
+    """
+    if not rank:
+        return ""
+    icon = RANK_ICON_LOOKUP.get(rank)
+    if icon is None:
+        # Unexpected format, match on the letters alone
+        tier = "".join(filter(str.isalpha, rank))
+        icon = next((icon for name, icon in RANK_ICONS.items() if name.replace(" ", "") == tier), "")
+    return icon
+
+
+def current_rss_mb() -> float | None:
+    """
+    Resident memory of this process in MB, or None if it can't be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Build the long-lived HTTP client shared by every MR API request.
+    """
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+class RivalsBot(commands.AutoShardedBot):
+    """
+    Bot that owns the pooled MR API client and the OCR workers for its whole lifetime.
+    Runs every shard, or the SHARD_IDS given to it by launcher.py.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.http_client: httpx.AsyncClient | None = None
+        self.api: MRApiClient | None = None
+        self.response_cache: ResponseCache | None = None
+        self.ocr: OCRPool | None = None
+        self.matches: MatchStore | None = None
+        self.rate_limiter: SharedTokenBucket | None = None
+        self.names: NameIndex | None = None
+        self.prefetcher: PrefetchScheduler | None = None
+        self.metrics_server = None
+        self.background_tasks = set()
+
+    async def setup_hook(self):
+        self.http_client = create_http_client()
+        # Opened here rather than at import, OCR workers re-import this module
+        self.response_cache = ResponseCache(CACHE_TTLS, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_DB_PATH)
+        self.matches = MatchStore(MATCH_DB_PATH) if MATCH_DB_PATH else None
+        if RATE_LIMIT_DB_PATH:
+            self.rate_limiter = SharedTokenBucket(RATE_LIMIT_DB_PATH, API_RATE_LIMIT, API_RATE_BURST)
+        self.names = NameIndex(NAME_DB_PATH or None)
+        log.info(f"Loaded {len(self.names)} known player names")
+        self.api = MRApiClient(self.http_client, cache=self.response_cache, store=self.matches, limiter=self.rate_limiter, names=self.names)
+        self.prefetcher = PrefetchScheduler(self.api)
+        refresh_hero_data.start()
+        if PREFETCH_ENABLED:
+            self.prefetcher.warm.start()
+        if METRICS_PORT:
+            self.metrics_server = await metrics.start_server(METRICS_HOST, METRICS_PORT)
+            log.info(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        if OCR_ENABLED and OCR_PRELOAD:
+            self.ocr_warm_up = asyncio.create_task(self.get_ocr().warm_up())
+
+        rss = current_rss_mb()
+        ocr_mode = ("preloading" if OCR_PRELOAD else "lazy") if OCR_ENABLED else "disabled"
+        log.info(
+            f"Started in {time.perf_counter() - STARTED_AT:.2f}s, "
+            f"RSS {f'{rss:.0f}MB' if rss is not None else 'unknown'}, OCR {ocr_mode}"
+        )
+
+    def get_ocr(self) -> OCRPool:
+        """
+        Return the OCR pool, starting it on first use.
+        """
+        if self.ocr is None:
+            self.ocr = OCRPool(OCR_WORKERS, OCR_QUEUE_SIZE, OCR_TIMEOUT, OCR_LANGUAGES)
+        return self.ocr
+
+    async def close(self):
+        refresh_hero_data.cancel()
+        if self.prefetcher is not None:
+            self.prefetcher.warm.cancel()
+        await super().close()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        if self.ocr is not None:
+            self.ocr.shutdown()
+            self.ocr = None
+        if self.metrics_server is not None:
+            await self.metrics_server.cleanup()
+            self.metrics_server = None
+        if self.response_cache is not None:
+            self.response_cache.close()
+            self.response_cache = None
+        if self.matches is not None:
+            self.matches.close()
+            self.matches = None
+        if self.rate_limiter is not None:
+            self.rate_limiter.close()
+            self.rate_limiter = None
+        if self.names is not None:
+            self.names.close()
+            self.names = None
 
 
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='r.', intents=intents)
+bot = RivalsBot(command_prefix='r.', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 bot.remove_command('help')
 
+@bot.before_invoke
+async def start_request(ctx: commands.Context):
+    # Every log line from here on, including background refreshes, carries this id
+    metrics.request_id.set(str(ctx.message.id))
+    request_guild.set(ctx.guild.id if ctx.guild else "dm")
+    ctx.started_at = time.perf_counter()
+    # Raising here skips the command and finish_request
+    ctx.admission_keys = await admission.admit(ctx)
+    COMMANDS_IN_FLIGHT.inc()
+
+def end_request(ctx: commands.Context):
+    """
+    Give back what start_request took. Only the first call for a command counts:
+    it runs from both finish_request and on_command_error, since a hybrid
+    command that fails as a slash command never runs its after_invoke hooks.
+    """
+    keys = getattr(ctx, "admission_keys", None)
+    if keys is None:
+        return
+    ctx.admission_keys = None
+    admission.release(keys)
+    COMMANDS_IN_FLIGHT.dec()
+    COMMAND_SECONDS.labels(ctx.command.qualified_name).observe(time.perf_counter() - ctx.started_at)
+
+@bot.after_invoke
+async def finish_request(ctx: commands.Context):
+    end_request(ctx)
+
+@bot.event
+async def on_command_error(ctx: commands.Context, error: commands.CommandError):
+    end_request(ctx)
+    if isinstance(error, QuotaExceeded):
+        # Slash commands need an answer, prefix commands only get one now and then
+        if ctx.interaction is not None or admission.warn(ctx.author.id):
+            await send_message(ctx, str(error), ephemeral=True)
+        return
+    await commands.Bot.on_command_error(bot, ctx, error)
+
 @bot.event
 async def on_ready():
     servers = str(len(bot.guilds))
     await bot.change_presence(activity=discord.CustomActivity(name=f'r.stats • In {servers} servers' ,emoji='🖥️'))
-    try:
-        await bot.tree.sync()
-        print(f"Synced slash commands for {bot.user}")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
-    print(f'Logged in as {bot.user}')
+    # Slash commands are global, one process syncing them is enough
+    if bot.shard_ids is None or 0 in bot.shard_ids:
+        try:
+            await bot.tree.sync()
+            log.info(f"Synced slash commands for {bot.user}")
+        except Exception as e:
+            log.error(f"Failed to sync commands: {e}")
+    log.info(f'Logged in as {bot.user} with shards {sorted(bot.shards)} of {bot.shard_count}')
 class PlayerNotFoundException(Exception):
     """Raised when a player cannot be found via the API."""
     pass
@@ -125,100 +655,1216 @@ class APIUpdateFailedException(Exception):
     """Raised when updating player data fails."""
     pass
 
+class UpstreamUnavailableException(APIUpdateFailedException):
+    """Raised when MR API keeps failing after every retry."""
+    pass
+
+class CircuitOpenException(UpstreamUnavailableException):
+    """Raised without calling MR API while the circuit breaker is open."""
+    pass
+
+
+@dataclass(slots=True)
+class HeroStat:
+    """
+    A player's stats on one hero.
+    """
+    hero_id: str
+    hero_name: str
+    has_ranked: bool
+    ranked_matches: int
+    ranked_wins: int
+    kdr: float
+    mvps: int
+
+    @classmethod
+    def from_payload(cls, hero_id: str, stats: dict) -> "HeroStat":
+        ranked = stats.get("ranked") or {}
+        return cls(
+            hero_id=hero_id,
+            hero_name=sys.intern(stats["hero_name"]),
+            has_ranked=bool(ranked),
+            ranked_matches=ranked.get("matches", 0),
+            ranked_wins=ranked.get("wins", 0),
+            kdr=float(ranked.get("kdr", 0.0)),
+            mvps=ranked.get("mvp", 0),
+        )
+
+
+@dataclass(slots=True)
+class Match:
+    """
+    One match from a player's match history.
+    """
+    match_uid: str
+    timestamp: int
+    duration_minutes: int
+    duration_seconds: int
+    season: int
+    map_name: str
+    map_gamemode: str
+    gamemode: str
+    score_ally: int
+    score_enemy: int
+    winner_side: int
+    player_side: int
+    mvp_uid: int
+    svp_uid: int
+    kills: int
+    deaths: int
+    assists: int
+    is_win: bool
+    hero_id: int
+
+    @classmethod
+    def from_payload(cls, match: dict) -> "Match":
+        stats = match["stats"]
+        # Maps and modes repeat across matches and players, so share the strings
+        return cls(
+            match_uid=match["match_uid"],
+            timestamp=match["match_timestamp"],
+            duration_minutes=match["match_duration"]["minutes"],
+            duration_seconds=match["match_duration"]["seconds"],
+            season=match["season"],
+            map_name=sys.intern(match["match_map"]["name"]),
+            map_gamemode=sys.intern(match["match_map"]["gamemode"]),
+            gamemode=sys.intern(match["gamemode"]["name"]),
+            score_ally=match["score"]["ally"],
+            score_enemy=match["score"]["enemy"],
+            winner_side=match["winner_side"],
+            player_side=match["player_side"],
+            mvp_uid=match["mvp_uid"],
+            svp_uid=match["svp_uid"],
+            kills=stats["kills"],
+            deaths=stats["deaths"],
+            assists=stats["assists"],
+            is_win=stats["is_win"],
+            hero_id=stats["hero"]["id"],
+        )
+
+
+@dataclass(slots=True)
+class Player:
+    """
+    A decoded /player payload, shared by stats, history and leaderboard.
+    """
+    name: str | None
+    uid: int | None
+    is_private: bool
+    rank: str | None
+    total_ranked_matches: int
+    total_ranked_wins: int
+    heroes: dict
+    matches: list
+    fetched_at: float = 0.0
+
+    @classmethod
+    def from_payload(cls, data: dict) -> "Player":
+        data = data or {}
+        stats = data.get("stats") or {}
+        ranked = stats.get("ranked") or {}
+        return cls(
+            name=data.get("player_name"),
+            uid=data.get("player_uid"),
+            is_private=data.get("is_profile_private") is True,
+            rank=(stats.get("rank") or {}).get("rank"),
+            total_ranked_matches=ranked.get("total_matches", 0),
+            total_ranked_wins=ranked.get("total_wins", 0),
+            heroes={
+                hero_id: HeroStat.from_payload(hero_id, hero)
+                for hero_id, hero in (data.get("hero_stats") or {}).items()
+            },
+            matches=[Match.from_payload(match) for match in data.get("match_history") or []],
+        )
+
+
+class MatchStore:
+    """
+    Every match seen in a player payload, kept in SQLite so long-term stats come
+    from indexed queries instead of the API's window of recent matches.
+    Payloads are ingested incrementally: matches older than the newest one stored
+    for the player, or stored at that same time, are skipped before touching the
+    database, the rest are deduplicated by match_uid. The raw match JSON is only
+    kept for new matches.
+    """
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            "player_uid TEXT NOT NULL, match_uid TEXT NOT NULL, timestamp INTEGER NOT NULL, "
+            "season INTEGER, map_name TEXT, gamemode TEXT, duration INTEGER, "
+            "score_ally INTEGER, score_enemy INTEGER, is_win INTEGER NOT NULL, hero_id INTEGER, "
+            "kills INTEGER, deaths INTEGER, assists INTEGER, payload BLOB, "
+            "PRIMARY KEY (player_uid, match_uid));"
+            "CREATE INDEX IF NOT EXISTS matches_player_time ON matches (player_uid, timestamp);"
+            "CREATE INDEX IF NOT EXISTS matches_player_map ON matches (player_uid, map_name);"
+            "CREATE INDEX IF NOT EXISTS matches_match_uid ON matches (match_uid);"
+        )
+        # Newest stored timestamp per player and the match uids stored at it,
+        # so a payload with nothing new costs no query
+        self.latest = LRUCache(CACHE_MAX_ENTRIES)
+        self.ingested = 0
+
+    def _is_stored(self, raw: dict, latest: int, latest_uids: frozenset) -> bool:
+        return raw["match_timestamp"] < latest or (raw["match_timestamp"] == latest and raw["match_uid"] in latest_uids)
+
+    def ingest(self, player_uid: str, matches: list) -> int:
+        """
+        Store the matches of a /player payload's match_history. Returns how many were new.
+        """
+        player_uid = str(player_uid)
+        with self.lock:
+            cached = self.latest.get(player_uid)
+            if cached is None:
+                latest = self.conn.execute(
+                    "SELECT MAX(timestamp) FROM matches WHERE player_uid = ?", (player_uid,)
+                ).fetchone()[0] or 0
+                latest_uids = frozenset(row[0] for row in self.conn.execute(
+                    "SELECT match_uid FROM matches WHERE player_uid = ? AND timestamp = ?", (player_uid, latest)
+                ))
+            else:
+                latest, latest_uids = cached
+            new = [raw for raw in matches if not self._is_stored(raw, latest, latest_uids)]
+            if not new:
+                if cached is None:
+                    self.latest.set(player_uid, (latest, latest_uids), float("inf"))
+                return 0
+            rows = []
+            for raw in new:
+                match = Match.from_payload(raw)
+                rows.append((
+                    player_uid, match.match_uid, match.timestamp, match.season, match.map_name, match.gamemode,
+                    match.duration_minutes * 60 + match.duration_seconds, match.score_ally, match.score_enemy,
+                    int(match.is_win), match.hero_id, match.kills, match.deaths, match.assists, orjson.dumps(raw),
+                ))
+            added = self.conn.executemany(
+                "INSERT OR IGNORE INTO matches (player_uid, match_uid, timestamp, season, map_name, gamemode, "
+                "duration, score_ally, score_enemy, is_win, hero_id, kills, deaths, assists, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+            self.conn.commit()
+            newest = max(raw["match_timestamp"] for raw in new)
+            if newest > latest:
+                latest, latest_uids = newest, frozenset()
+            latest_uids = latest_uids | {raw["match_uid"] for raw in new if raw["match_timestamp"] == latest}
+            self.latest.set(player_uid, (latest, latest_uids), float("inf"))
+            self.ingested += added
+        return added
+
+    def trends(self, player_uid: str, windows: tuple = (10, 25, 50, 100), rolling: int = 10,
+               points: int = 30, maps: int = 8) -> dict | None:
+        """
+        Long-term stats of a player, or None if nothing is stored for them:
+        totals, win rate over their last N matches for each window, a rolling
+        win rate over the last `points` matches and their most played maps.
+        """
+        player_uid = str(player_uid)
+        with self.lock:
+            total, wins, first, last, kills, deaths, assists = self.conn.execute(
+                "SELECT COUNT(*), SUM(is_win), MIN(timestamp), MAX(timestamp), SUM(kills), SUM(deaths), SUM(assists) "
+                "FROM matches WHERE player_uid = ?",
+                (player_uid,),
+            ).fetchone()
+            if not total:
+                return None
+            # Only points with a full rolling window, the first few would swing wildly
+            points = min(points, max(1, total - rolling + 1))
+            recent = [row[0] for row in self.conn.execute(
+                "SELECT is_win FROM matches WHERE player_uid = ? ORDER BY timestamp DESC LIMIT ?",
+                (player_uid, max(windows)),
+            )]
+            form = [row[0] for row in self.conn.execute(
+                "SELECT AVG(is_win) OVER (ORDER BY timestamp ROWS BETWEEN ? PRECEDING AND CURRENT ROW) "
+                "FROM matches WHERE player_uid = ? ORDER BY timestamp DESC LIMIT ?",
+                (rolling - 1, player_uid, points),
+            )]
+            map_rows = self.conn.execute(
+                "SELECT map_name, COUNT(*), SUM(is_win), SUM(kills), SUM(deaths), SUM(assists) "
+                "FROM matches WHERE player_uid = ? GROUP BY map_name ORDER BY COUNT(*) DESC LIMIT ?",
+                (player_uid, maps),
+            ).fetchall()
+        return {
+            "Matches": total,
+            "Wins": wins,
+            "First Match": first,
+            "Last Match": last,
+            "KDA": round((kills + assists) / max(1, deaths), 2),
+            "Win Rates": {
+                window: round(sum(recent[:window]) / len(recent[:window]) * 100, 2)
+                for window in windows if window <= len(recent)
+            },
+            # Oldest first, as a percentage
+            "Form": [round(value * 100, 2) for value in reversed(form)],
+            "Maps": [
+                {
+                    "Map": map_name,
+                    "Matches": count,
+                    "Win Rate (%)": round(map_wins / count * 100, 2),
+                    "KDA": round((map_kills + map_assists) / max(1, map_deaths), 2),
+                }
+                for map_name, count, map_wins, map_kills, map_deaths, map_assists in map_rows
+            ],
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class NameIndex:
+    """
+    Every player name resolved so far and its id, so names can be resolved,
+    corrected and autocompleted without calling MR API. Keys are lower-cased
+    like get_player_id's check. Prefix search bisects a sorted list of keys;
+    fuzzy matching only compares the names sharing the most trigrams with the
+    query. Entries are loaded from SQLite at startup and written back as they
+    are added, when a path is given.
+    """
+    def __init__(self, path: str | None = None):
+        # lower-cased name -> (name as the API spells it, user id, when it was resolved)
+        self.entries = {}
+        self.keys = []
+        self.trigrams = defaultdict(set)
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                "key TEXT PRIMARY KEY, name TEXT NOT NULL, user_id TEXT NOT NULL, resolved_at REAL NOT NULL)"
+            )
+            for key, name, user_id, resolved_at in self.conn.execute("SELECT key, name, user_id, resolved_at FROM names"):
+                self.entries[key] = (name, user_id, resolved_at)
+                for trigram in self._trigrams(key):
+                    self.trigrams[trigram].add(key)
+            self.keys = sorted(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _trigrams(key: str) -> set:
+        # Padded so the start and end of a name weigh more than its middle
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, name: str, user_id) -> bool:
+        """
+        Record a name MR API resolved. Returns True when it should be save()d,
+        i.e. the index persists and the entry is new or changed.
+        """
+        key = name.lower()
+        entry = self.entries.get(key)
+        if entry is None:
+            bisect.insort(self.keys, key)
+            for trigram in self._trigrams(key):
+                self.trigrams[trigram].add(key)
+        self.entries[key] = (name, str(user_id), time.time())
+        return self.conn is not None and (entry is None or entry[:2] != (name, str(user_id)))
+
+    def save(self, name: str):
+        """
+        Write an entry to SQLite. Blocking, run it in a thread.
+        """
+        entry = self.entries.get(name.lower())
+        if entry is None:
+            return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)", (name.lower(), *entry))
+            self.conn.commit()
+
+    def get(self, name: str, max_age: float = float("inf")) -> tuple[str, str] | None:
+        """
+        (name, user id) for an exact, case-insensitive match resolved within max_age seconds.
+        """
+        entry = self.entries.get(name.lower())
+        if entry is None or time.time() - entry[2] > max_age:
+            return None
+        return entry[0], entry[1]
+
+    def _candidates(self, key: str, limit: int) -> list:
+        shared = Counter()
+        for trigram in self._trigrams(key):
+            shared.update(self.trigrams.get(trigram, ()))
+        return [candidate for candidate, _ in shared.most_common(limit)]
+
+    def closest(self, name: str, cutoff: float) -> str | None:
+        """
+        The known name most similar to name (difflib ratio, 0-1), if it's at least
+        cutoff. None when two names are equally close, guessing could pick the wrong player.
+        """
+        key = name.lower()
+        if key in self.entries:
+            return self.entries[key][0]
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, key, candidate).ratio(), candidate) for candidate in self._candidates(key, 20)),
+            reverse=True,
+        )
+        if not scored or scored[0][0] < cutoff or (len(scored) > 1 and scored[1][0] == scored[0][0]):
+            return None
+        return self.entries[scored[0][1]][0]
+
+    def search(self, text: str, limit: int = 25) -> list:
+        """
+        Names starting with text, then the closest fuzzy matches to fill up to limit.
+        """
+        key = text.lower()
+        results = []
+        for candidate in self.keys[bisect.bisect_left(self.keys, key):]:
+            if not candidate.startswith(key) or len(results) == limit:
+                break
+            results.append(candidate)
+        if len(results) < limit and len(key) >= 2:
+            for candidate in self._candidates(key, limit):
+                if candidate not in results:
+                    results.append(candidate)
+                    if len(results) == limit:
+                        break
+        return [self.entries[candidate][0] for candidate in results]
+
+    def close(self):
+        if self.conn is not None:
+            with self.lock:
+                self.conn.close()
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for upstream requests.
+    A 429 response pauses the whole bucket for the Retry-After duration.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def try_acquire(self) -> float:
+        """
+        Take a token without waiting. Returns 0 if one was taken, otherwise how
+        many seconds until one is available.
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # Start refilling when the pause ends, not during it
+        self.tokens = 0.0
+        self.updated = self.paused_until
+
+
+class FairScheduler:
+    """
+    Hands out MR API request slots fairly between guilds, with start-time fair
+    queuing: a waiting request is tagged with its guild's virtual start time,
+    which advances by 1/weight per request, and the smallest tag goes next.
+    A guild sending many requests only delays its own.
+    Requests are in one of two lanes: "fast" lookups get a free slot first,
+    "slow" player updates may hold at most slow_slots at once. While updates
+    wait and none is running, one slot is kept for them so they can't starve.
+    """
+    LANES = ("fast", "slow")
+
+    def __init__(self, slots: int, slow_slots: int, weights: dict | None = None):
+        self.slots = slots
+        self.slow_slots = min(slots, slow_slots)
+        self.weights = weights or {}
+        self.running = Counter()
+        self.queues = {lane: [] for lane in self.LANES}
+        # Requests still waiting per lane; cancelled ones stay in the queue until popped
+        self.waiting = Counter()
+        self.virtual_time = {lane: 0.0 for lane in self.LANES}
+        # Last tag per guild, only needed while the lane has a queue
+        self.last_tags = {lane: {} for lane in self.LANES}
+        self.order = itertools.count()
+
+    def _has_slot(self, lane: str) -> bool:
+        running = sum(self.running.values())
+        if running >= self.slots:
+            return False
+        if lane == "slow":
+            return self.running["slow"] < self.slow_slots
+        return not (self.waiting["slow"] and not self.running["slow"] and running >= self.slots - 1)
+
+    async def acquire(self, lane: str):
+        queue = self.queues[lane]
+        # The fast lane goes first, so the slow lane also waits while lookups do
+        if not self.waiting[lane] and self._has_slot(lane) and (lane == "fast" or not self.waiting["fast"]):
+            self.running[lane] += 1
+            return
+        guild = request_guild.get()
+        last_tags = self.last_tags[lane]
+        tag = max(self.virtual_time[lane], last_tags.get(guild, 0.0)) + 1 / self.weights.get(guild, 1.0)
+        last_tags[guild] = tag
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue, (tag, next(self.order), future))
+        self.waiting[lane] += 1
+        API_QUEUED.labels(lane).inc()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before being cancelled, give the slot back
+                self.release(lane)
+            else:
+                # No longer waiting, so it mustn't keep a slot reserved for its lane
+                future.cancel()
+                self.waiting[lane] -= 1
+                self._dispatch()
+            raise
+        finally:
+            API_QUEUED.labels(lane).dec()
+
+    def release(self, lane: str):
+        self.running[lane] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for lane in self.LANES:
+            queue = self.queues[lane]
+            while queue and self._has_slot(lane):
+                tag, _, future = heapq.heappop(queue)
+                if future.done():
+                    continue
+                self.virtual_time[lane] = tag
+                self.running[lane] += 1
+                self.waiting[lane] -= 1
+                future.set_result(None)
+            if not self.waiting[lane]:
+                self.last_tags[lane].clear()
+
+
+class QuotaExceeded(commands.CommandError):
+    """Raised when a command is over its user's or guild's quota."""
+    pass
+
+
+class Admission:
+    """
+    Admission control in front of the command handlers.
+    Every user and guild has a command rate (a TokenBucket) and a number of
+    commands that may run at once. A command over a rate is turned away; one
+    over a concurrency limit waits in line and is shown its position.
+    Expensive commands also share EXPENSIVE_MAX_CONCURRENT slots, a lane of
+    their own, so cheap lookups never queue behind image reading.
+    A waiting command only holds up later commands that need the same full limit.
+    """
+    # Commands in the expensive lane, every other command is cheap
+    EXPENSIVE = {"leaderboard"}
+
+    def __init__(self):
+        self.running = Counter()
+        self.rates = LRUCache(100000)
+        # Users already told they're over their rate, so spamming doesn't get a reply each time
+        self.warned = LRUCache(10000)
+        # [keys, future, status message, position shown], in arrival order
+        self.waiting = []
+
+    @staticmethod
+    def limit(key: tuple) -> int:
+        kind = key[0]
+        if kind == "user":
+            return USER_MAX_CONCURRENT
+        if kind == "guild":
+            return GUILD_MAX_CONCURRENT
+        return EXPENSIVE_MAX_CONCURRENT
+
+    def _over_rate(self, key: tuple, per_minute: float, burst: int) -> float:
+        bucket = self.rates.get(key)
+        if bucket is None:
+            bucket = TokenBucket(per_minute / 60, burst)
+        self.rates.set(key, bucket, ttl=max(60.0, burst / (per_minute / 60)))
+        return bucket.try_acquire()
+
+    def check_rates(self, user_id: int, guild_id: int | None) -> tuple:
+        """
+        Take one command from the user's and the guild's rates and return their keys.
+        Raises QuotaExceeded if either is over its rate.
+        """
+        user = ("user", user_id)
+        guild = ("guild", guild_id if guild_id is not None else f"dm-{user_id}")
+        for key, per_minute, burst in ((user, USER_COMMANDS_PER_MINUTE, USER_COMMAND_BURST),
+                                       (guild, GUILD_COMMANDS_PER_MINUTE, GUILD_COMMAND_BURST)):
+            wait = self._over_rate(key, per_minute, burst)
+            if wait > 0:
+                ADMISSION_REJECTED.labels(f"{key[0]}_rate").inc()
+                raise QuotaExceeded(
+                    f"{'You are' if key is user else 'This server is'} sending commands too fast, "
+                    f"try again in {math.ceil(wait)}s."
+                )
+        return user, guild
+
+    def _fits(self, keys: tuple) -> bool:
+        return all(self.running[key] < self.limit(key) for key in keys)
+
+    def _dispatch(self):
+        """
+        Start every waiting command that fits, in order. A command that doesn't
+        fit blocks the limits it is waiting for, not the others.
+        """
+        blocked = set()
+        for entry in list(self.waiting):
+            keys, future = entry[:2]
+            if future.done():
+                self.waiting.remove(entry)
+                continue
+            if self._fits(keys) and not blocked.intersection(keys):
+                for key in keys:
+                    self.running[key] += 1
+                self.waiting.remove(entry)
+                future.set_result(None)
+            else:
+                blocked.update(key for key in keys if self.running[key] >= self.limit(key))
+        for position, entry in self._positions():
+            if entry[2] is not None and entry[3] != position:
+                entry[3] = position
+                entry[2].update(content=f"⏳ Queued, position {position}...")
+
+    def _positions(self):
+        """
+        (position, entry) for every waiting command, counting only the commands
+        ahead of it that share one of its limits.
+        """
+        for i, entry in enumerate(self.waiting):
+            keys = set(entry[0])
+            yield 1 + sum(1 for other in self.waiting[:i] if keys.intersection(other[0])), entry
+
+    async def admit(self, ctx: commands.Context) -> tuple:
+        """
+        Wait for ctx's turn and return the keys to release() when it's done.
+        Raises QuotaExceeded if it's over a rate or too many commands are waiting.
+        """
+        user, guild = self.check_rates(ctx.author.id, ctx.guild.id if ctx.guild else None)
+        lane = "expensive" if ctx.command.qualified_name in self.EXPENSIVE else "cheap"
+        if sum(1 for entry in self.waiting if user in entry[0]) >= USER_MAX_QUEUED:
+            ADMISSION_REJECTED.labels("queue_full").inc()
+            raise QuotaExceeded("You already have commands waiting, please wait for them to finish.")
+
+        keys = (user, guild, ("lane", "expensive")) if lane == "expensive" else (user, guild)
+        entry = [keys, asyncio.get_running_loop().create_future(), None, None]
+        self.waiting.append(entry)
+        self._dispatch()
+        if entry[1].done():
+            ADMISSION_WAIT_SECONDS.labels(lane).observe(0.0)
+            return keys
+
+        started = time.perf_counter()
+        ADMISSION_QUEUED.labels(lane).inc()
+        try:
+            entry[3] = next(position for position, other in self._positions() if other is entry)
+            entry[2] = StatusMessage(await send_message(ctx, f"⏳ Queued, position {entry[3]}..."))
+            await entry[1]
+        except BaseException:
+            if entry[1].done() and not entry[1].cancelled():
+                self.release(keys)
+            else:
+                entry[1].cancel()
+                self._dispatch()
+            raise
+        finally:
+            ADMISSION_QUEUED.labels(lane).dec()
+        ADMISSION_WAIT_SECONDS.labels(lane).observe(time.perf_counter() - started)
+        run_in_background(entry[2].delete())
+        return keys
+
+    def release(self, keys: tuple):
+        for key in keys:
+            self.running[key] -= 1
+            if self.running[key] <= 0:
+                del self.running[key]
+        self._dispatch()
+
+    def warn(self, user_id: int) -> bool:
+        """
+        Whether to tell a user about a rejection, once every few seconds at most.
+        """
+        if self.warned.get(user_id) is not None:
+            return False
+        self.warned.set(user_id, True, ttl=10)
+        return True
+
+admission = Admission()
+
+def tag_interaction(interaction: discord.Interaction):
+    """
+    Tag a button press for the logs and the MR API scheduler.
+    """
+    metrics.request_id.set(str(interaction.id))
+    request_guild.set(interaction.guild_id or "dm")
+
+async def admit_interaction(interaction: discord.Interaction) -> bool:
+    """
+    Tag a button press that goes to MR API and count it against the user's and
+    guild's command rates. Presses over a rate are answered privately and not run.
+    """
+    tag_interaction(interaction)
+    try:
+        admission.check_rates(interaction.user.id, interaction.guild_id)
+    except QuotaExceeded as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return False
+    return True
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """
+    How a request to one MR API endpoint is retried after a timeout, a connection
+    error or a 5xx response. Delays grow exponentially with full jitter, so
+    commands that failed together don't all retry at the same moment.
+    """
+    attempts: int
+    base_delay: float
+    max_delay: float
+    timeout: float | None = None
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+RETRY_POLICIES = {
+    "heroes": RetryPolicy(attempts=3, base_delay=1.0, max_delay=10.0),
+    "player-id": RetryPolicy(attempts=3, base_delay=0.25, max_delay=2.0),
+    # Updates are slow and expensive upstream, so give them longer but retry less
+    "player-update": RetryPolicy(attempts=2, base_delay=1.0, max_delay=4.0, timeout=HTTP_UPDATE_TIMEOUT),
+    "player": RetryPolicy(attempts=3, base_delay=0.25, max_delay=2.0),
+}
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to MR API after repeated failures.
+    After `threshold` failures in a row the circuit opens and requests are
+    rejected for reset_timeout seconds. Then one trial request is let through:
+    if it succeeds the circuit closes again, otherwise it stays open.
+    """
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half-open"
+        if self.state == "half-open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            log.info("MR API is back, closing the circuit")
+            API_CIRCUIT_OPEN.set(0)
+        self.state = "closed"
+        self.failures = 0
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.state == "half-open" or self.failures >= self.threshold:
+            if self.state != "open":
+                log.warning(f"MR API failed {self.failures} times in a row, opening the circuit for {self.reset_timeout:g}s")
+                API_CIRCUIT_OPEN.set(1)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def abandon(self):
+        """
+        A request that was let through got cancelled before it finished.
+        """
+        self.trial_running = False
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket whose state lives in a SQLite file, so every process using the
+    same file shares one rate limit. Waiters within a process queue on a lock
+    like TokenBucket; across processes the database transaction decides.
+    """
+    def __init__(self, path: str, rate: float, burst: int, name: str = "mrapi"):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.lock = asyncio.Lock()
+        self.db_lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL)"
+        )
+        self.conn.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, 0)", (name, float(burst), time.time()))
+
+    def _take(self) -> float:
+        """
+        Take a token if there is one. Returns 0 if it did, otherwise how long to wait.
+        """
+        with self.db_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated, paused_until = self.conn.execute(
+                    "SELECT tokens, updated, paused_until FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                # Wall clock rather than monotonic, it has to mean the same in every process
+                now = time.time()
+                if now < paused_until:
+                    wait = paused_until - now
+                else:
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                    wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+                    if tokens >= 1:
+                        tokens -= 1
+                    self.conn.execute(
+                        "UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, self.name)
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                wait = await asyncio.to_thread(self._take)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def _pause(self, seconds: float):
+        with self.db_lock:
+            now = time.time()
+            self.conn.execute(
+                "UPDATE buckets SET paused_until = MAX(paused_until, ?), tokens = 0, updated = MAX(paused_until, ?) WHERE name = ?",
+                (now + seconds, now + seconds, self.name),
+            )
+
+    async def pause(self, seconds: float):
+        await asyncio.to_thread(self._pause, seconds)
+
+    def close(self):
+        with self.db_lock:
+            self.conn.close()
+
+
+def parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date.
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one in-flight task.
+    Every caller awaits the same result, or receives the same exception.
+    """
+    def __init__(self):
+        self._inflight = {}
+        self.calls = Counter()
+        self.collapsed = Counter()
+
+    async def do(self, key: tuple, func, *args, **kwargs):
+        namespace = key[0]
+        self.calls[namespace] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.collapsed[namespace] += 1
+            API_COLLAPSED.labels(namespace).inc()
+        # Shield so one caller being cancelled doesn't cancel the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: tuple, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "collapsed": dict(self.collapsed),
+            "in_flight": len(self._inflight),
+        }
+
+
+class FreshnessTracker:
+    """
+    Remembers when each player was last refreshed server-side by update_player,
+    so repeat lookups within min_interval can skip the slow update.
+    Given the response cache's SQLite file, updates are shared with every
+    process using it, so workers don't repeat each other's updates.
+    """
+    def __init__(self, min_interval: float, max_entries: int, disk: SQLiteCache | None = None):
+        self.min_interval = min_interval
+        self.updated = LRUCache(max_entries)
+        self.disk = disk
+        self.skipped = 0
+
+    async def mark_updated(self, user_id: str):
+        now = time.time()
+        self.updated.set(str(user_id), now, self.min_interval)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, "player-updated", str(user_id), orjson.dumps(now), now + self.min_interval)
+
+    def is_fresh(self, user_id: str) -> bool:
+        """
+        Whether this process updated the player recently, or already saw another one did.
+        """
+        return self.updated.get(str(user_id)) is not None
+
+    async def check(self, user_id: str) -> bool:
+        """
+        is_fresh, also asking the shared file about updates by other processes.
+        """
+        if self.is_fresh(user_id):
+            return True
+        if self.disk is None:
+            return False
+        row = await asyncio.to_thread(self.disk.get, "player-updated", str(user_id))
+        if row is None:
+            return False
+        value, expires_at = row
+        self.updated.set(str(user_id), orjson.loads(value), expires_at - time.time())
+        return True
+
 
 class MRApiClient:
     """
     Client to interact with MR API.
+    All requests share one pooled connection, wait for one of max_in_flight
+    slots (shared fairly between guilds by a FairScheduler) so a burst of
+    commands can't open unbounded upstream requests, and go through a token
+    bucket so we stay under the API's rate limit.
+    Successful responses are stored in the (optional) response cache; pass
+    fresh=True to skip the cached copy and always ask the API. update_player
+    is skipped for players refreshed in the last PLAYER_UPDATE_INTERVAL.
+    Concurrent lookups for the same player share a single request.
+    Failed requests are retried per RETRY_POLICIES and a circuit breaker stops
+    calling the API while it's down; cached stats are served meanwhile.
+    Matches in every decoded player payload go into the (optional) match store.
     """
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(self, client: httpx.AsyncClient, cache: ResponseCache | None = None,
+                 max_in_flight: int = API_MAX_IN_FLIGHT, store: MatchStore | None = None,
+                 limiter: TokenBucket | SharedTokenBucket | None = None, names: NameIndex | None = None):
         self.client = client
+        self.cache = cache
+        self.store = store
+        # Every name resolved so far, consulted before asking MR API
+        self.names = names if names is not None else NameIndex()
+        # Player payloads are kept decoded in memory, the raw body only goes to disk
+        self.players = LRUCache(CACHE_MAX_ENTRIES, PLAYER_CACHE_MAX_BYTES)
+        self.freshness = FreshnessTracker(PLAYER_UPDATE_INTERVAL, CACHE_MAX_ENTRIES, cache.disk if cache is not None else None)
+        self.scheduler = FairScheduler(max_in_flight, API_SLOW_LANE_SLOTS, GUILD_WEIGHTS)
+        self.limiter = limiter if limiter is not None else TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
+        self.flights = SingleFlight()
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+        self.hedged = 0
+
+    async def _send(self, url: str, endpoint: str, timeout: float | None = None) -> httpx.Response:
+        lane = "slow" if endpoint == "player-update" else "fast"
+        # The slot comes first so the rate limit is also handed out in fair order
+        await self.scheduler.acquire(lane)
+        try:
+            await self.limiter.acquire()
+            with API_IN_FLIGHT.track(), API_SECONDS.labels(endpoint).time():
+                if timeout is None:
+                    return await self.client.get(url)
+                return await self.client.get(url, timeout=timeout)
+        finally:
+            self.scheduler.release(lane)
+
+    async def _get(self, url: str, endpoint: str) -> httpx.Response:
+        """
+        GET with the endpoint's retry policy. Timeouts, connection errors and 5xx
+        responses are retried with backoff, 429s after their Retry-After delay.
+        Still being rate limited after API_MAX_429_RETRIES raises
+        UpstreamUnavailableException too. Any other response is returned for
+        the caller to check.
+        """
+        policy = RETRY_POLICIES[endpoint]
+        failures = 0
+        rate_limited = 0
+        while True:
+            if not self.breaker.allow():
+                API_REQUESTS.labels(endpoint, "circuit-open").inc()
+                raise CircuitOpenException("MR API is unavailable, try again later.")
+            try:
+                response = await self._send(url, endpoint, policy.timeout)
+            except httpx.TransportError as e:
+                reason = type(e).__name__
+                API_REQUESTS.labels(endpoint, reason).inc()
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            else:
+                API_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    if response.status_code != 429:
+                        return response
+                    if rate_limited == API_MAX_429_RETRIES:
+                        raise UpstreamUnavailableException(f"MR API {endpoint} is still rate limiting after {rate_limited} retries.")
+                    rate_limited += 1
+                    delay = parse_retry_after(response.headers.get("Retry-After"))
+                    log.warning(f"Rate limited by MR API, retrying in {delay:.1f}s")
+                    await self.limiter.pause(delay)
+                    continue
+                reason = f"status {response.status_code}"
+            self.breaker.record_failure()
+            failures += 1
+            if failures >= policy.attempts:
+                raise UpstreamUnavailableException(f"MR API {endpoint} failed {failures} times, last with {reason}.")
+            delay = policy.delay(failures - 1)
+            log.warning(f"MR API {endpoint} failed with {reason}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _hedged_get(self, url: str, endpoint: str) -> httpx.Response:
+        """
+        _get, plus a second identical request when the first hasn't answered
+        within API_HEDGE_DELAY. The first to succeed wins, the other is cancelled.
+        """
+        requests = [asyncio.ensure_future(self._get(url, endpoint))]
+        try:
+            done, _ = await asyncio.wait(requests, timeout=API_HEDGE_DELAY)
+            if not done:
+                self.hedged += 1
+                requests.append(asyncio.ensure_future(self._get(url, endpoint)))
+            pending = set(requests)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for request in done:
+                    if request.exception() is None:
+                        return request.result()
+                if not pending:
+                    raise request.exception()
+        finally:
+            for request in requests:
+                if not request.done():
+                    request.cancel()
+                elif not request.cancelled():
+                    # Mark a losing request's exception as retrieved
+                    request.exception()
+
+    async def _cache_get(self, namespace: str, key: str, fresh: bool = False, memory: bool = True) -> bytes | None:
+        entry = await self._cache_get_entry(namespace, key, fresh, memory)
+        return entry[0] if entry is not None else None
+
+    async def _cache_get_entry(self, namespace: str, key: str, fresh: bool = False,
+                               memory: bool = True) -> tuple[bytes, float] | None:
+        if self.cache is None or fresh:
+            return None
+        return await self.cache.get_entry(namespace, key, memory=memory)
+
+    async def _cache_set(self, namespace: str, key: str, content: bytes, memory: bool = True):
+        if self.cache is not None:
+            await self.cache.set(namespace, key, content, memory=memory)
+
+    async def get_heroes(self) -> list:
+        response = await self._get(f"{API_BASE_URL}/heroes", "heroes")
+        if response.status_code != 200:
+            log.warning(f"get_heroes failed with status {response.status_code}")
+            raise APIUpdateFailedException("Failed to fetch hero data.")
+        return orjson.loads(response.content)
 
     async def get_player_id(self, name: str) -> dict:
+        known = self.names.get(name, NAME_INDEX_MAX_AGE)
+        if known is not None:
+            CACHE_LOOKUPS.labels("name-index", "hit").inc()
+            return {"name": known[0], "id": known[1]}
+        CACHE_LOOKUPS.labels("name-index", "miss").inc()
+        return await self.flights.do(("player-id", name.lower()), self._get_player_id, name)
+
+    async def _remember_name(self, data: dict):
+        if self.names.add(data["name"], data["id"]):
+            await asyncio.to_thread(self.names.save, data["name"])
+
+    async def update_player(self, user_id: str, force: bool = False) -> dict:
+        if not force and await self.freshness.check(user_id):
+            self.freshness.skipped += 1
+            return {"success": True, "skipped": True}
+        return await self.flights.do(("player-update", str(user_id)), self._update_player, user_id)
+
+    async def get_player_stats(self, user_id: str, fresh: bool = False) -> Player:
+        return await self.flights.do(("player", str(user_id), fresh), self._get_player_stats, user_id, fresh)
+
+    async def _get_player_id(self, name: str) -> dict:
+        cached = await self._cache_get("player-id", name.lower())
+        if cached is not None:
+            data = orjson.loads(cached)
+            await self._remember_name(data)
+            return data
         url = f"{API_BASE_URL}/player-id/{urllib.parse.quote(name)}"
-        response = await self.client.get(url)
+        response = await self._get(url, "player-id")
         if response.status_code != 200:
-            print(f"get_player_id failed with status {response.status_code}")
+            log.warning(f"get_player_id failed with status {response.status_code}")
             raise PlayerNotFoundException(f"Player {name} not found.")
         data = orjson.loads(response.content)
         if data.get("id") is None or data.get("name", "").lower() != name.lower():
             raise PlayerNotFoundException(f"Player {name} not found.")
+        await self._cache_set("player-id", name.lower(), response.content)
+        await self._remember_name(data)
         return data
 
-    async def update_player(self, user_id: str) -> dict:
+    async def _update_player(self, user_id: str) -> dict:
         url = f"{API_BASE_URL}/player-update/{user_id}"
-        response = await self.client.get(url)
+        response = await self._get(url, "player-update")
         if response.status_code != 200:
-            print(f"update_player failed with status {response.status_code}")
+            log.warning(f"update_player failed with status {response.status_code}")
             raise APIUpdateFailedException("Failed to update player data.")
         data = orjson.loads(response.content)
         if not data.get("success", False):
             raise APIUpdateFailedException("API update not successful.")
+        await self.freshness.mark_updated(user_id)
         return data
 
-    async def get_player_stats(self, user_id: str) -> dict:
-        url = f"{API_BASE_URL}/player/{user_id}"
-        response = await self.client.get(url)
-        if response.status_code != 200:
-            print(f"get_player_stats failed with status {response.status_code}")
-            raise APIUpdateFailedException("Failed to fetch player stats.")
-        return orjson.loads(response.content)
+    async def get_stale_player(self, user_id: str) -> Player | None:
+        """
+        Cached player that is due for a refresh, to show while it's being refreshed.
+        None if nothing is cached or the player was refreshed recently anyway.
+        """
+        if await self.freshness.check(user_id):
+            return None
+        return self.players.get(str(user_id))
+
+    async def _get_player_stats(self, user_id: str, fresh: bool = False) -> Player:
+        if not fresh:
+            player = self.players.get(str(user_id))
+            if player is not None and time.time() - player.fetched_at < CACHE_TTLS["player"]:
+                CACHE_LOOKUPS.labels("player-decoded", "hit").inc()
+                return player
+            CACHE_LOOKUPS.labels("player-decoded", "miss").inc()
+        entry = await self._cache_get_entry("player", str(user_id), fresh, memory=False)
+        if entry is not None:
+            # Possibly fetched by another process, a while ago
+            content, fetched_at = entry
+        else:
+            url = f"{API_BASE_URL}/player/{user_id}"
+            try:
+                if API_HEDGE_DELAY > 0:
+                    response = await self._hedged_get(url, "player")
+                else:
+                    response = await self._get(url, "player")
+            except UpstreamUnavailableException:
+                # While MR API is down, older stats beat an error
+                player = self.players.get(str(user_id))
+                if fresh or player is None:
+                    raise
+                log.warning(f"MR API unavailable, serving cached stats for {user_id}")
+                return player
+            if response.status_code != 200:
+                log.warning(f"get_player_stats failed with status {response.status_code}")
+                raise APIUpdateFailedException("Failed to fetch player stats.")
+            content = response.content
+            fetched_at = time.time()
+            await self._cache_set("player", str(user_id), content, memory=False)
+        # Decode once, every command reuses the same Player until it expires
+        data = orjson.loads(content)
+        player = Player.from_payload(data)
+        player.fetched_at = fetched_at
+        self.players.set(str(user_id), player, PLAYER_STALE_MAX_AGE, size=len(content))
+        if self.store is not None and data.get("match_history"):
+            try:
+                await asyncio.to_thread(self.store.ingest, user_id, data["match_history"])
+            except (sqlite3.Error, KeyError, TypeError) as e:
+                log.warning(f"Failed to store matches for {user_id}: {e!r}")
+        return player
 
     
-def parse_stats(data: dict) -> dict:
+@metrics.timed(STAGE_SECONDS.labels("parse_stats"))
+def parse_stats(player: Player) -> dict:
     """
-    Parse player stats JSON from the API into a structured dict.
+    Summarise a player's stats into a structured dict.
     """
-    if not data or data.get("is_profile_private") is True or not data.get("match_history"):
-        player_rank = data.get("stats", {}).get("rank", {}).get("rank")
-        if player_rank:
-            raise PrivateProfileException(player_rank)
+    if player.is_private or not player.matches:
+        if player.rank:
+            raise PrivateProfileException(player.rank)
         else:
             return {"Private": "true"}
-    
-    username = data.get("player_name")
-    rank = data["stats"]["rank"]["rank"]
-    ranked_stats = data["stats"]["ranked"]
-    total_ranked_matches = ranked_stats["total_matches"]
-    total_ranked_wins = ranked_stats["total_wins"]
+
+    total_ranked_matches = player.total_ranked_matches
+    total_ranked_wins = player.total_ranked_wins
     overall_winrate = round(
         (total_ranked_wins / total_ranked_matches) * 100, 2
     ) if total_ranked_matches > 0 else 0
 
-    hero_stats = data["hero_stats"]
-    hero_data = []
-    for stats in hero_stats.values():
-        ranked = stats.get("ranked")
-        if ranked:
-            hero_data.append({
-                "Hero": stats["hero_name"],
-                "Matches": ranked.get("matches", 0),
-                "Wins": ranked.get("wins", 0),
-                "Losses": ranked.get("matches", 0) - ranked.get("wins", 0),
-                "Win Rate (%)": round(
-                    (ranked.get("wins", 0) / ranked.get("matches", 1)) * 100, 2
-                ) if ranked.get("matches", 0) > 0 else 0,
-                "K/D Ratio": float(ranked.get("kdr", 0.0)),
-                "MVPs": ranked.get("mvp", 0),
-            })
+    # Only the top 3 need a full summary, so pick them first
+    ranked_heroes = (hero for hero in player.heroes.values() if hero.has_ranked)
+    top_3 = heapq.nlargest(3, ranked_heroes, key=lambda hero: hero.ranked_matches)
+    top_3_heroes = [
+        {
+            "Hero": hero.hero_name,
+            "Matches": hero.ranked_matches,
+            "Wins": hero.ranked_wins,
+            "Losses": hero.ranked_matches - hero.ranked_wins,
+            "Win Rate (%)": round((hero.ranked_wins / hero.ranked_matches) * 100, 2) if hero.ranked_matches > 0 else 0,
+            "K/D Ratio": hero.kdr,
+            "MVPs": hero.mvps,
+        }
+        for hero in top_3
+    ]
 
-    hero_df = pd.DataFrame(hero_data).fillna({'Matches': 0}).sort_values(
-        by="Matches", ascending=False
-    )
-    top_3_heroes = hero_df.head(3)
-    
     # Count recently played heroes and calculate recent win rate
-    match_history = data.get("match_history", [])
-    recent_heroes = []
     recent_wins = Counter()
     recent_games = Counter()
-    for match in match_history:
-        hero_id = str(match["stats"]["hero"]["id"])
-        if hero_id in hero_stats:
-            hero_name = hero_stats[hero_id]["hero_name"]
-            recent_heroes.append(hero_name)
-            recent_games[hero_name] += 1
-            if match["stats"]["is_win"]:
-                recent_wins[hero_name] += 1
+    for match in player.matches:
+        hero = player.heroes.get(str(match.hero_id))
+        if hero is not None:
+            recent_games[hero.hero_name] += 1
+            if match.is_win:
+                recent_wins[hero.hero_name] += 1
     
     recent_hero_data = [
         {
@@ -226,61 +1872,90 @@ def parse_stats(data: dict) -> dict:
             "Matches in Recent History": count,
             "Win Rate (%)": round((recent_wins[hero] / count) * 100, 2) if count > 0 else 0
         }
-        for hero, count in recent_games.items()
+        for hero, count in heapq.nlargest(5, recent_games.items(), key=lambda item: item[1])
     ]
-    
-    recent_hero_df = pd.DataFrame(recent_hero_data).sort_values(
-        by="Matches in Recent History", ascending=False
-    ).head(5)
 
-    recent_matches = len(match_history)
+    recent_matches = len(player.matches)
     recent_winrate = round((sum(recent_wins.values()) / recent_matches) * 100, 2) if recent_matches > 0 else 0
 
     results = {
-        "Username": username,
+        "Username": player.name,
         "Private": "false",
-        "Rank": rank,
+        "Rank": player.rank,
         "Overall Ranked Stats": {
             "Total Ranked Matches": total_ranked_matches,
             "Total Wins": total_ranked_wins,
             "Overall Win Rate (%)": overall_winrate,
         },
-        "Top 3 Most Played Heroes in Ranked": top_3_heroes.to_dict(orient="records"),
-        "Recently Played Heroes": recent_hero_df.to_dict(orient="records"),
+        "Top 3 Most Played Heroes in Ranked": top_3_heroes,
+        "Recently Played Heroes": recent_hero_data,
         "Recent Matches Win Rate (%)": recent_winrate,
     }
     return results
 
 
+class EmbedCache:
+    """
+    LRU of rendered embeds keyed by a hash of the data they were built from plus
+    the hero data version, so unchanged stats (a Refresh click, a repeated
+    lookup, a leaderboard re-run) skip rendering. Only the timestamp is updated
+    on a hit. The same Embed objects are handed out every time, so treat them
+    as read-only: copying them (Embed.from_dict) costs more than rendering.
+    """
+    def __init__(self, max_entries: int):
+        self.entries = LRUCache(max_entries)
+
+    def get_or_build(self, kind: str, data, render) -> list:
+        digest = hashlib.blake2b(orjson.dumps(data), digest_size=16).digest()
+        key = (kind, hero_meta.version, digest)
+        embeds = self.entries.get(key)
+        if embeds is not None:
+            CACHE_LOOKUPS.labels(f"embed-{kind}", "hit").inc()
+            now = datetime.now()
+            for embed in embeds:
+                if embed.timestamp is not None:
+                    embed.timestamp = now
+            return embeds
+        CACHE_LOOKUPS.labels(f"embed-{kind}", "miss").inc()
+        embeds = render(data)
+        # Entries never go stale, the key changes with the data
+        self.entries.set(key, embeds, ttl=float("inf"))
+        return embeds
+
+embed_cache = EmbedCache(EMBED_CACHE_ENTRIES)
+
+@metrics.timed(STAGE_SECONDS.labels("build_embed"))
 def build_embed(results: dict) -> discord.Embed:
     """
     Build a Discord embed from the parsed stats.
     """
+    return embed_cache.get_or_build("stats", results, render_embed)[0]
+
+def render_embed(results: dict) -> list:
     username = results["Username"]
-    rank = results.get("Rank", "Unranked")
-    rank_tier = ''.join(filter(str.isalpha, rank))
-    rank_icon = RANK_ICONS.get(rank_tier, "")
+    rank = results.get("Rank") or "Unranked"
     
     top_heroes = results.get("Top 3 Most Played Heroes in Ranked", [])
     top_hero = top_heroes[0]['Hero'] if top_heroes else None
 
+    # Read the tables once so a refresh mid-build can't mix versions
+    heroes = hero_meta
     # Determine color (default to black if hero not found)
-    color_hex = HEROES_COLORS.get(top_hero, "#000000")
     embed = discord.Embed(
         title=f"📊 {username}'s Stats",
         url=f"https://tracker.gg/marvel-rivals/profile/ign/{urllib.parse.quote(username)}/overview",
-        colour=discord.Colour(int(color_hex.lstrip('#'), 16)),
+        colour=discord.Colour(heroes.colour_ints.get(top_hero, 0x000000)),
         timestamp=datetime.now()
     )
 
-    if top_hero and top_hero in HEROES_ICONS:
-        embed.set_thumbnail(url=HEROES_ICONS[top_hero])
+    if top_hero and top_hero in heroes.icons:
+        embed.set_thumbnail(url=heroes.icons[top_hero])
 
     overall = results["Overall Ranked Stats"]
     embed.add_field(
         name="🏆 Overall Stats",
         value=(
-            f"• **Rank:** {rank} {rank_icon}\n"
+            f"• **Rank:** {rank} {rank_icon(rank)}\n"
             f"• **Win Rate:** {overall['Overall Win Rate (%)']}%\n"
             f"• **Matches:** {overall['Total Ranked Matches']}\n"
             f"• **Wins:** {overall['Total Wins']}"
@@ -318,95 +1993,196 @@ def build_embed(results: dict) -> discord.Embed:
         text="Powered by RivalsX",
         icon_url="https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"
     )
-    return embed
+    return [embed]
+
+class PrefetchScheduler:
+    """
+    Keeps the most looked up players warm in the cache.
+    Every lookup adds to a player's score, scores decay each interval, and the
+    top players scoring at least PREFETCH_MIN_SCORE are refreshed in the
+    background within a budget of API calls.
+    """
+    def __init__(self, api: MRApiClient, top_n: int = PREFETCH_TOP_N, calls_per_minute: int = PREFETCH_CALLS_PER_MINUTE):
+        self.api = api
+        self.top_n = top_n
+        self.calls_per_interval = max(1, int(calls_per_minute * PREFETCH_INTERVAL / 60))
+        self.scores = Counter()
+        self.refreshed = 0
 
-async def fetch_player_stats(name: str) -> dict:
+    def record(self, user_id: str):
+        self.scores[str(user_id)] += 1
+
+    def needs_refresh(self, user_id: str) -> bool:
+        player = self.api.players.get(user_id)
+        if player is None:
+            return True
+        # Refresh anything that would go stale before the next run, but never
+        # something fetched less than half its TTL ago, even if the TTL is
+        # shorter than the interval
+        ttl = CACHE_TTLS["player"]
+        return time.time() - player.fetched_at >= ttl - min(PREFETCH_INTERVAL, ttl / 2)
+
+    @tasks.loop(seconds=PREFETCH_INTERVAL)
+    async def warm(self):
+        budget = self.calls_per_interval
+        for user_id, score in self.scores.most_common(self.top_n):
+            if score < PREFETCH_MIN_SCORE:
+                break
+            if not self.needs_refresh(user_id):
+                continue
+            # An update costs an extra call unless the player was updated recently
+            needs_update = not await self.api.freshness.check(user_id)
+            cost = 2 if needs_update else 1
+            if cost > budget:
+                break
+            budget -= cost
+            try:
+                if needs_update:
+                    await self.api.update_player(user_id)
+                await self.api.get_player_stats(user_id, fresh=True)
+                self.refreshed += 1
+            except CircuitOpenException:
+                # MR API is down, leave the rest for the next run
+                break
+            except Exception as e:
+                log.warning(f"Prefetch for {user_id} failed: {e}")
+
+        for user_id in list(self.scores):
+            self.scores[user_id] *= PREFETCH_DECAY
+            if self.scores[user_id] < 0.1:
+                del self.scores[user_id]
+
+async def fetch_player(name: str, fresh: bool = False, update: bool = True, progress=None) -> Player:
+    """
+    Fetch a player using the MRApiClient.
+    fresh=True bypasses the cached stats, update=False skips asking the API to
+    refresh the player first (it's skipped anyway if that happened recently).
+    progress, if given, is called with a short description of each step.
+    """
+    # Get the player ID
+    player_data = await bot.api.get_player_id(name)
+    return await fetch_player_by_id(player_data["id"], name, fresh=fresh, update=update, progress=progress)
+
+async def fetch_player_by_id(user_id: str, name: str, fresh: bool = False, update: bool = True, progress=None) -> Player:
+    """
+    fetch_player for a user id that was already resolved, name is only used in messages.
+    """
+    api_client = bot.api
+    bot.prefetcher.record(user_id)
+
+    # Update player data
+    if update:
+        if progress is not None and not await api_client.freshness.check(user_id):
+            progress(f"Updating {name} on MR API...")
+        try:
+            await api_client.update_player(user_id)
+        except UpstreamUnavailableException as e:
+            # The stats may still be served from the cache
+            log.warning(f"Skipping update for {name}: {e}")
+
+    # Fetch detailed player stats
+    if progress is not None:
+        progress(f"Loading stats for {name}...")
+    return await api_client.get_player_stats(user_id, fresh=fresh)
+
+async def fetch_player_stats(name: str, fresh: bool = False, progress=None) -> dict:
     """
     Fetch player stats using the MRApiClient.
+    fresh=True bypasses the cached stats.
+    """
+    return parse_stats(await fetch_player(name, fresh=fresh, progress=progress))
+
+async def fetch_stale_player(name: str) -> tuple[str, Player | None]:
     """
-    async with httpx.AsyncClient() as http_client:
-        api_client = MRApiClient(http_client)
-        # Get the player ID
-        player_data = await api_client.get_player_id(name)
-        user_id = player_data["id"]
+    Resolve a name and return the user id along with a cached copy of the player
+    that is due for a refresh, if we have one.
+    """
+    player_data = await bot.api.get_player_id(name)
+    user_id = player_data["id"]
+    bot.prefetcher.record(user_id)
+    return user_id, await bot.api.get_stale_player(user_id)
 
-        # Update player data
-        await api_client.update_player(user_id)
+async def refresh_player(user_id: str) -> Player:
+    """
+    Update a player server-side and fetch the new stats, skipping the cache.
+    """
+    await bot.api.update_player(user_id)
+    return await bot.api.get_player_stats(user_id, fresh=True)
 
-        # Fetch detailed player stats
-        stats_data = await api_client.get_player_stats(user_id)
-        return parse_stats(stats_data)
+def format_age(player: Player) -> str:
+    minutes = int((time.time() - player.fetched_at) // 60)
+    if minutes < 1:
+        return "less than a minute ago"
+    return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
 
-def parse_history(data: dict) -> list:
+def run_in_background(coro):
     """
-    Parse match history JSON from the API into a structured list.
+    Run a coroutine without awaiting it, keeping a reference until it's done.
     """
-    if not data or not data.get("match_history"):
-        return []
+    task = asyncio.create_task(coro)
+    bot.background_tasks.add(task)
+    task.add_done_callback(bot.background_tasks.discard)
+    return task
 
-    name = data.get("player_name")
-    match_history = data.get("match_history", [])
+@metrics.timed(STAGE_SECONDS.labels("parse_history"))
+def parse_history(player: Player) -> list:
+    """
+    Turn a player's match history into a structured list.
+    """
     parsed_history = []
-    for match in match_history:
-        kills = match["stats"]["kills"]
-        deaths = match["stats"]["deaths"]
-        assists = match["stats"]["assists"]
+    for match in player.matches:
+        kills = match.kills
+        deaths = match.deaths
+        assists = match.assists
 
         # Compute KDA ratio (avoiding division by zero)
         kda_ratio = (kills + assists) / deaths if deaths != 0 else (kills + assists)
 
         parsed_history.append({
-            "Name": name,
-            "Match Timestamp": datetime.fromtimestamp(match['match_timestamp'], UTC).strftime('%Y-%m-%d %H:%M:%S'),
-            "Match Duration": f"{match['match_duration']['minutes']}m {match['match_duration']['seconds']}s",
-            "Season": match["season"],
-            "Match UID": match["match_uid"],
-            "Map": match["match_map"]["name"],
-            "Gamemode": match["gamemode"]["name"].title(),
-            "Gamemode2": match["match_map"]["gamemode"].title(),
-            "Score": f"Ally: {match['score']['ally']} - Enemy: {match['score']['enemy']}",
-            "Winner Side": match["winner_side"],
-            "Player Side": match["player_side"],
-            "MVP UID": match["mvp_uid"],
-            "SVP UID": match["svp_uid"],
+            "Name": player.name,
+            "Match Timestamp": datetime.fromtimestamp(match.timestamp, UTC).strftime('%Y-%m-%d %H:%M:%S'),
+            "Match Duration": f"{match.duration_minutes}m {match.duration_seconds}s",
+            "Season": match.season,
+            "Match UID": match.match_uid,
+            "Map": match.map_name,
+            "Gamemode": match.gamemode.title(),
+            "Gamemode2": match.map_gamemode.title(),
+            "Score": f"Ally: {match.score_ally} - Enemy: {match.score_enemy}",
+            "Winner Side": match.winner_side,
+            "Player Side": match.player_side,
+            "MVP UID": match.mvp_uid,
+            "SVP UID": match.svp_uid,
             "Kills": kills,
             "Deaths": deaths,
             "Assists": assists,
-            "Is Win": match["stats"]["is_win"],
-            "Hero ID": match["stats"]["hero"]["id"],
+            "Is Win": match.is_win,
+            "Hero ID": match.hero_id,
             "KDA": f"{kda_ratio:.2f}",
         })
     return parsed_history
 
-async def fetch_history_data(name: str) -> dict:
+async def fetch_history_data(name: str) -> list:
     """
     Fetch match history data using the MRApiClient.
     """
-    async with httpx.AsyncClient() as http_client:
-        api_client = MRApiClient(http_client)
-        # Get the player ID
-        player_data = await api_client.get_player_id(name)
-        user_id = player_data["id"]
-
-        # Update player data
-        await api_client.update_player(user_id)
-
-        # Fetch detailed player stats
-        stats_data = await api_client.get_player_stats(user_id)
-        return parse_history(stats_data)
+    return parse_history(await fetch_player(name))
     
-def build_history_embeds(history: list) -> discord.Embed:
+@metrics.timed(STAGE_SECONDS.labels("build_history_embeds"))
+def build_history_embeds(history: list, page: int = 0, page_size: int = HISTORY_PAGE_SIZE) -> list:
     """
-    Build Discord embeds for the parsed history.
+    Build Discord embeds for one page of the parsed history.
+    Only the matches on that page are rendered.
     """
-    embeds = []
     if not history:
         return [discord.Embed(title="No match history found.", colour=0xff0000)]
-    for match in history:
-        if len(embeds) >= 10:
-            break
+    return embed_cache.get_or_build("history", history[page * page_size:(page + 1) * page_size], render_history_page)
+
+def render_history_page(matches: list) -> list:
+    embeds = []
+    heroes = hero_meta
+    for match in matches:
         embed = discord.Embed(
-            title='Victory' if match['Is Win'] else 'Defeat' + f" ({match['Name']})",
+            title=f"{'Victory' if match['Is Win'] else 'Defeat'} ({match['Name']})",
             url=f"https://tracker.gg/marvel-rivals/matches/{match['Match UID']}",
             colour=discord.Colour(0x5EE790) if match['Is Win'] else discord.Colour(0xE4485D),
             timestamp=datetime.now()
@@ -414,62 +2190,508 @@ def build_history_embeds(history: list) -> discord.Embed:
 
         embed.add_field(
             name="Details",
-            value=f"- {match['Gamemode']}\n- **Time**: {match["Match Timestamp"]}\n- **Duration**: {match["Match Duration"]}\n- **Gamemode**: {match["Gamemode2"]}\n- **Map**: {match["Map"]}\n- **Score**: {match["Score"]}",
+            value=f"- {match['Gamemode']}\n- **Time**: {match['Match Timestamp']}\n- **Duration**: {match['Match Duration']}\n- **Gamemode**: {match['Gamemode2']}\n- **Map**: {match['Map']}\n- **Score**: {match['Score']}",
             inline=True
         )
         embed.add_field(name="Performance",
                         value=f"- **KDA**: {match['KDA']}\n- **Kills**: {match['Kills']}\n- **Deaths**: {match['Deaths']}\n- **Assists**: {match['Assists']}",
                         inline=True)
         hero_id = match["Hero ID"]
-        hero_name = IDS_HEROES.get(str(hero_id), "Unknown Hero")
+        hero_name = heroes.ids_heroes.get(str(hero_id), "Unknown Hero")
         embed.add_field(name="Heroes Played",
                 value=f"- {hero_name}",
                 inline=True)
         
-        embed.set_thumbnail(url=HEROES_ICONS.get(hero_name, "https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"))
+        embed.set_thumbnail(url=heroes.icons.get(hero_name, "https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"))
         embed.set_footer(
             text="Powered by RivalsX",
             icon_url="https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"
         )
         embeds.append(embed)
     return embeds
+
+def split_names(text: str) -> list:
+    """
+    Player names given to r.compare: separated by commas if there are any
+    (names can contain spaces), otherwise by spaces. Repeats are dropped.
+    """
+    parts = text.split(",") if "," in text else text.split()
+    names = {}
+    for part in parts:
+        if part.strip():
+            names.setdefault(part.strip().lower(), part.strip())
+    return list(names.values())
+
+@metrics.timed(STAGE_SECONDS.labels("compare_players"))
+def compare_players(players: list) -> list:
+    """
+    One r.compare row per (name, Player), all columns computed in a single pass
+    over each player's heroes and recent matches. Private profiles (or ones with
+    no match history, like parse_stats) only get their rank.
+    """
+    rows = []
+    for name, player in players:
+        row = {
+            "Username": player.name or name,
+            "Rank": player.rank or "Unranked",
+            "Private": player.is_private or not player.matches,
+        }
+        if not row["Private"]:
+            kills = deaths = assists = wins = 0
+            for match in player.matches:
+                kills += match.kills
+                deaths += match.deaths
+                assists += match.assists
+                wins += match.is_win
+            ranked_heroes = (hero for hero in player.heroes.values() if hero.has_ranked)
+            top_3 = heapq.nlargest(3, ranked_heroes, key=lambda hero: hero.ranked_matches)
+            matches = player.total_ranked_matches
+            row.update({
+                "Matches": matches,
+                "Win Rate (%)": round(player.total_ranked_wins / matches * 100, 2) if matches > 0 else 0,
+                "Recent Win Rate (%)": round(wins / len(player.matches) * 100, 2),
+                "KDA": round((kills + assists) / max(1, deaths), 2),
+                "Top Heroes": [(hero.hero_name, hero.ranked_matches) for hero in top_3],
+            })
+        rows.append(row)
+    return rows
+
+@metrics.timed(STAGE_SECONDS.labels("build_compare_embed"))
+def build_compare_embed(rows: list, not_found: list) -> discord.Embed:
+    """
+    One embed with a table of every compared player and their top heroes.
+    """
+    public = [row for row in rows if not row["Private"]]
+    heroes = hero_meta
+    # Coloured after the top hero of whoever has the best win rate
+    leader = max(public, key=lambda row: row["Win Rate (%)"], default=None)
+    top_hero = leader["Top Heroes"][0][0] if leader and leader["Top Heroes"] else None
+    embed = discord.Embed(
+        title=f"⚔️ Comparing {len(rows)} players",
+        colour=discord.Colour(heroes.colour_ints.get(top_hero, 0xF8BC6C)),
+        timestamp=datetime.now()
+    )
+    if top_hero and top_hero in heroes.icons:
+        embed.set_thumbnail(url=heroes.icons[top_hero])
+
+    # Code block so the columns line up
+    table = [("Player", "Rank", "WR", "Games", "Recent", "KDA")]
+    for row in rows:
+        if row["Private"]:
+            table.append((row["Username"][:16], row["Rank"], "private", "", "", ""))
+        else:
+            table.append((
+                row["Username"][:16], row["Rank"], f"{row['Win Rate (%)']}%", str(row["Matches"]),
+                f"{row['Recent Win Rate (%)']}%", str(row["KDA"]),
+            ))
+    widths = [max(len(line[column]) for line in table) for column in range(len(table[0]))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in table]
+    embed.description = "```\n" + "\n".join(lines) + "\n```"
+
+    if public:
+        embed.add_field(
+            name="Most Played Heroes",
+            value="\n".join(
+                f"• **{row['Username']}**: " + (", ".join(f"{hero} ({matches})" for hero, matches in row["Top Heroes"]) or "none")
+                for row in public
+            ),
+            inline=False
+        )
+        if len(public) > 1:
+            best = lambda key: max(public, key=lambda row: row[key])["Username"]
+            embed.add_field(
+                name="Leaders",
+                value=(
+                    f"• **Win Rate:** {best('Win Rate (%)')}\n"
+                    f"• **Recent Win Rate:** {best('Recent Win Rate (%)')}\n"
+                    f"• **KDA:** {best('KDA')}\n"
+                    f"• **Matches:** {best('Matches')}"
+                ),
+                inline=False
+            )
+    if not_found:
+        embed.add_field(name="Not found", value=", ".join(not_found), inline=False)
+    embed.set_footer(
+        text="Powered by RivalsX",
+        icon_url="https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"
+    )
+    return embed
+
+def build_missing_embed(not_found: list, private_profiles: list) -> discord.Embed:
+    """
+    One embed for every leaderboard name without stats, instead of a message each.
+    Names that weren't found link to tracker.gg.
+    """
+    embed = discord.Embed(title="Players without stats", colour=discord.Colour(0x808080))
+    if not_found:
+        embed.add_field(
+            name="❓ Couldn't find",
+            value="\n".join(
+                f"• [{discord.utils.escape_markdown(name)}](https://tracker.gg/marvel-rivals/profile/ign/{urllib.parse.quote(name)}/overview)"
+                for name in not_found
+            )[:1024],
+            inline=False
+        )
+    if private_profiles:
+        embed.add_field(
+            name="🔒 Private profiles",
+            value=", ".join(discord.utils.escape_markdown(name) for name in private_profiles)[:1024],
+            inline=False
+        )
+    return embed
+
+FORM_BLOCKS = "▁▂▃▄▅▆▇█"
+
+@metrics.timed(STAGE_SECONDS.labels("build_trends_embed"))
+def build_trends_embed(name: str, trends: dict) -> discord.Embed:
+    """
+    Build a Discord embed from MatchStore.trends.
+    """
+    win_rates = trends["Win Rates"]
+    overall = round(trends["Wins"] / trends["Matches"] * 100, 2)
+    latest = next(iter(win_rates.values()), overall)
+    embed = discord.Embed(
+        title=f"📈 {name}'s Trends",
+        description=(
+            f"{trends['Matches']} matches stored since "
+            f"{datetime.fromtimestamp(trends['First Match'], UTC).strftime('%Y-%m-%d')}"
+        ),
+        colour=discord.Colour(0x5EE790) if latest >= overall else discord.Colour(0xE4485D),
+        timestamp=datetime.now()
+    )
+    embed.add_field(
+        name="🏆 Win Rate",
+        value="\n".join(
+            [f"• **Last {window}:** {rate}%" for window, rate in win_rates.items()]
+            + [f"• **All stored:** {overall}%", f"• **KDA:** {trends['KDA']}"]
+        ),
+        inline=True
+    )
+    if len(trends["Form"]) > 1:
+        blocks = "".join(FORM_BLOCKS[min(len(FORM_BLOCKS) - 1, int(rate / 100 * len(FORM_BLOCKS)))] for rate in trends["Form"])
+        embed.add_field(
+            name="Form",
+            value=f"`{blocks}`\nRolling win rate, oldest to newest: {trends['Form'][0]}% → {trends['Form'][-1]}%",
+            inline=False
+        )
+    if trends["Maps"]:
+        embed.add_field(
+            name="🗺️ Maps",
+            value="\n".join(
+                f"• **{row['Map']}**: {row['Matches']} matches, {row['Win Rate (%)']}% WR, {row['KDA']} KDA"
+                for row in trends["Maps"]
+            ),
+            inline=False
+        )
+    embed.set_footer(
+        text="Powered by RivalsX",
+        icon_url="https://cdn2.steamgriddb.com/icon/916030603cc86a9b3d29f4d64f1bc415/32/256x256.png"
+    )
+    return embed
+
+# Discord's limits for a single message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+class ChannelSendQueue:
+    """
+    Queues sends per channel behind a TokenBucket sized like Discord's message
+    bucket, so a burst of sends to one channel waits its turn here, in order,
+    instead of being rejected with 429s and retried by discord.py.
+    Buckets of channels that have gone quiet are dropped.
+    """
+    def __init__(self, rate: float, burst: int, max_channels: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = LRUCache(max_channels)
+
+    def bucket(self, channel_id: int) -> TokenBucket:
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+        # Refreshed on every use, an idle bucket is full again after burst / rate seconds
+        self.buckets.set(channel_id, bucket, ttl=max(60.0, self.burst / self.rate))
+        return bucket
+
+    async def send(self, target: discord.abc.Messageable, *args, **kwargs) -> discord.Message:
+        # Slash command replies are interaction webhooks, not channel messages
+        channel = getattr(target, "channel", target)
+        if getattr(target, "interaction", None) is None and getattr(channel, "id", None) is not None:
+            with STAGE_SECONDS.labels("discord_queue").time():
+                await self.bucket(channel.id).acquire()
+        return await target.send(*args, **kwargs)
+
+send_queue = ChannelSendQueue(DISCORD_SEND_RATE, DISCORD_SEND_BURST)
+
+def batch_embeds(embeds: list) -> list:
+    """
+    Group embeds into as few messages as Discord allows: at most 10 embeds and
+    6000 characters of embed text per message.
+    """
+    batches = []
+    batch, chars = [], 0
+    for embed in embeds:
+        size = len(embed)
+        if batch and (len(batch) == MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_EMBED_CHARS_PER_MESSAGE):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(embed)
+        chars += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def send_message(target: discord.abc.Messageable, *args, **kwargs) -> discord.Message:
+    """
+    target.send() through the per-channel send queue, timed as the discord_send stage.
+    """
+    with STAGE_SECONDS.labels("discord_send").time():
+        return await send_queue.send(target, *args, **kwargs)
+
+async def edit_message(message: discord.Message, **kwargs) -> discord.Message:
+    """
+    message.edit(), timed as the discord_edit stage.
+    """
+    with STAGE_SECONDS.labels("discord_edit").time():
+        return await message.edit(**kwargs)
+
+class StatusMessage:
+    """
+    A message showing how far along a command is. update() doesn't wait on
+    Discord: edits are sent one at a time in the background and only the newest
+    one still waiting is sent, so progress updates never slow the command down
+    and an older edit can't land after a newer one.
+    """
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.pending = None
+        self.task = None
+
+    def update(self, **kwargs):
+        self.pending = kwargs
+        if self.task is None or self.task.done():
+            self.task = run_in_background(self._flush())
+
+    async def _flush(self):
+        while self.pending is not None:
+            kwargs, self.pending = self.pending, None
+            try:
+                await edit_message(self.message, **kwargs)
+            except discord.HTTPException as e:
+                log.warning(f"Progress update failed: {e}")
+
+    async def finish(self, **kwargs) -> discord.Message:
+        """
+        Drop progress that hasn't been shown yet and make this the final edit.
+        """
+        self.pending = None
+        if self.task is not None:
+            await self.task
+        return await edit_message(self.message, **kwargs)
+
+    async def delete(self):
+        """
+        Drop progress that hasn't been shown yet and delete the message.
+        """
+        self.pending = None
+        if self.task is not None:
+            await self.task
+        try:
+            await self.message.delete()
+        except discord.HTTPException:
+            pass
+
+def progress_bar(done: int, total: int, width: int = 12) -> str:
+    filled = round(done / total * width) if total else width
+    return f"{'▰' * filled}{'▱' * (width - filled)} {done}/{total}"
+
+class CancelView(discord.ui.View):
+    """
+    A Cancel button only the user who ran the command can press. Pressing it
+    cancels the given tasks.
+    """
+    def __init__(self, author_id: int, tasks: list | None = None):
+        super().__init__(timeout=600)
+        self.author_id = author_id
+        self.tasks = tasks if tasks is not None else []
+        self.cancelled = False
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Only the person who ran the command can cancel it.", ephemeral=True)
+            return False
+        return True
+
+    def cancel_tasks(self):
+        self.cancelled = True
+        self.stop()
+        for task in self.tasks:
+            task.cancel()
+
+    @discord.ui.button(emoji="✖️", label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cancel_tasks()
+        await interaction.response.defer()
+
 class StatsView(discord.ui.View):
     def __init__(self):
         super().__init__()
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await admit_interaction(interaction)
+
     @discord.ui.button(emoji="🔄", label="Refresh", style=discord.ButtonStyle.secondary)
     async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
         message = interaction.message
         name = message.embeds[0].title.split("'s")[0].replace("📊 ", "")
-        await message.edit(content=f"Updating stats for {name}...", embed=None)
+        await edit_message(message, content=f"Updating stats for {name}...", embed=None)
         await interaction.response.defer()
         try:
-            results = await fetch_player_stats(name)
+            results = await fetch_player_stats(name, fresh=True)
             embed = build_embed(results)
-            await message.edit(content=None, embed=embed)
+            await edit_message(message, content=None, embed=embed)
+        except Exception as e:
+            await edit_message(message, content=f"Failed to refresh stats: {e}")
+
+class HistoryView(discord.ui.View):
+    """
+    Pages through a parsed match history, building each page when it's shown.
+    """
+    def __init__(self, history: list, page_size: int = HISTORY_PAGE_SIZE):
+        super().__init__(timeout=300)
+        self.history = history
+        self.page_size = page_size
+        self.page = 0
+        self.pages = max(1, -(-len(history) // page_size))
+        self.message = None
+        self.note = None
+        self.update_buttons()
+
+    def set_history(self, history: list):
+        self.history = history
+        self.pages = max(1, -(-len(history) // self.page_size))
+        self.page = min(self.page, self.pages - 1)
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = self.page >= self.pages - 1
+
+    def page_content(self) -> str | None:
+        lines = [self.note] if self.note else []
+        if self.pages > 1:
+            lines.append(f"Page {self.page + 1}/{self.pages}")
+        return "\n".join(lines) or None
+
+    async def show(self, message: discord.Message):
+        await edit_message(message, 
+            content=self.page_content(),
+            embeds=build_history_embeds(self.history, self.page, self.page_size),
+            view=self if self.pages > 1 else None
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Paging only reads the history we already have, it isn't rate limited
+        tag_interaction(interaction)
+        return True
+
+    async def show_page(self, interaction: discord.Interaction):
+        self.update_buttons()
+        embeds = build_history_embeds(self.history, self.page, self.page_size)
+        with STAGE_SECONDS.labels("discord_edit").time():
+            await interaction.response.edit_message(content=self.page_content(), embeds=embeds, view=self)
+
+    async def revalidate(self, user_id: str):
+        """
+        Refresh the player in the background and swap in the new history.
+        """
+        try:
+            self.set_history(parse_history(await refresh_player(user_id)))
+            self.note = None
         except Exception as e:
-            await message.edit(content=f"Failed to refresh stats: {e}")
+            log.warning(f"Background history refresh failed: {e}")
+            self.note = "Couldn't refresh, showing older matches."
+        try:
+            await self.show(self.message)
+        except discord.HTTPException:
+            pass
+
+    @discord.ui.button(emoji="⬅️", label="Prev", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await self.show_page(interaction)
+
+    @discord.ui.button(emoji="➡️", label="Next", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.pages - 1, self.page + 1)
+        await self.show_page(interaction)
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await edit_message(self.message, view=None)
+            except discord.HTTPException:
+                pass
+
+async def revalidate_stats(message: discord.Message, name: str, user_id: str, stale: Player):
+    """
+    Refresh a player in the background and replace the stale stats in message.
+    """
+    try:
+        player = await refresh_player(user_id)
+        embed = build_embed(parse_stats(player))
+        await edit_message(message, content=None, embed=embed, view=StatsView())
+    except Exception as e:
+        log.warning(f"Background refresh for {name} failed: {e}")
+        try:
+            await edit_message(message, content=f"Couldn't refresh, showing stats from {format_age(stale)}.")
+        except discord.HTTPException:
+            pass
+
+def not_found_message(name: str) -> str:
+    """
+    The reply for an unknown name, suggesting the closest name we know of.
+    """
+    url = f"https://tracker.gg/marvel-rivals/profile/ign/{urllib.parse.quote(name.replace(' ', '%20'))}/overview"
+    suggestion = bot.api.names.closest(name, OCR_NAME_MATCH_CUTOFF) if bot.api is not None else None
+    if suggestion is not None and suggestion.lower() != name.lower():
+        return f"{name} couldn't be found. Did you mean **{suggestion}**? Otherwise try checking here: {url}"
+    return f"{name} couldn't be found. Try checking here: {url}"
+
+async def autocomplete_name(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """
+    Suggest player names from the name index as the user types, no API calls.
+    """
+    if bot.api is None or not current:
+        return []
+    return [app_commands.Choice(name=name, value=name) for name in bot.api.names.search(current, 25)]
 
 @bot.hybrid_command(name="stats", description="Get stats for a given player name.")
+@app_commands.autocomplete(name=autocomplete_name)
 async def stats(ctx: commands.Context, *, name: str):
     """
     Get stats for a given player name.
     Usage: r.stats <username>
     """
-    print(f"Fetching stats for {name}")
-    message = await ctx.send(f"Fetching stats for {name}...", view=StatsView())
+    log.info(f"Fetching stats for {name}")
+    message = await send_message(ctx, f"Fetching stats for {name}...", view=StatsView())
     try:
-        results = await fetch_player_stats(name)
+        user_id, stale = await fetch_stale_player(name)
+        if stale is not None:
+            # Answer straight away with what we have and refresh in the background
+            embed = build_embed(parse_stats(stale))
+            await edit_message(message, content=f"Stats as of {format_age(stale)}, refreshing...", embed=embed, view=StatsView())
+            run_in_background(revalidate_stats(message, name, user_id, stale))
+            return
+        status = StatusMessage(message)
+        results = await fetch_player_stats(name, progress=lambda step: status.update(content=step))
         embed = build_embed(results)
-        await message.edit(content=None, embed=embed, view=StatsView())
+        await status.finish(content=None, embed=embed, view=StatsView())
     except PlayerNotFoundException:
-        url = f"https://tracker.gg/marvel-rivals/profile/ign/{urllib.parse.quote(name.replace(' ', '%20'))}/overview"
-        await ctx.send(f"{name} couldn't be found. Try checking here: {url}")
+        await send_message(ctx, not_found_message(name))
     except PrivateProfileException as e:
         if e:
-            rank_tier = ''.join(filter(str.isalpha, str(e)))
-            rank_icon = RANK_ICONS.get(rank_tier, "")
-            desc = f"🔒 This profile is set to private.\n**Rank:** {e} {rank_icon}"
+            desc = f"🔒 This profile is set to private.\n**Rank:** {e} {rank_icon(str(e))}"
             
         else:
             desc = "🔒 This profile is set to private."
@@ -480,99 +2702,246 @@ async def stats(ctx: commands.Context, *, name: str):
             colour=0xff0000,
             timestamp=datetime.now()
         )
-        await ctx.send(embed=embed)
+        await send_message(ctx, embed=embed)
     except APIUpdateFailedException:
-        await ctx.send(f"Error updating data for {name}")
-    except Exception as e:
-        print(e)
-        await ctx.send("An unexpected error occurred while fetching stats.")
+        await send_message(ctx, f"Error updating data for {name}")
+    except Exception:
+        log.exception(f"Fetching stats for {name} failed")
+        ERRORS.labels("stats").inc()
+        await send_message(ctx, "An unexpected error occurred while fetching stats.")
+
+@bot.hybrid_command(name="history", description="Get recent matches for a player.")
+@app_commands.autocomplete(name=autocomplete_name)
+async def history(ctx: commands.Context, *, name: str):
+    """
+    Get recent matches for a given player name.
+    Usage: r.history <username>
+    """
+    log.info(f"Fetching history for {name}")
+    message = await send_message(ctx, f"Fetching match history for {name}...")
+    try:
+        # Served from the same cached player as r.stats when it was looked up recently
+        user_id, stale = await fetch_stale_player(name)
+        history = parse_history(stale) if stale is not None else await fetch_history_data(name)
+        view = HistoryView(history)
+        view.message = message
+        if stale is not None:
+            view.note = f"Matches as of {format_age(stale)}, refreshing..."
+        await view.show(message)
+        # Started only once the stale page is up, so the refreshed one can't be overwritten by it
+        if stale is not None:
+            run_in_background(view.revalidate(user_id))
+    except PlayerNotFoundException:
+        await edit_message(message, content=not_found_message(name))
+    except APIUpdateFailedException:
+        await edit_message(message, content=f"Error updating data for {name}")
+    except Exception:
+        log.exception(f"Fetching history for {name} failed")
+        ERRORS.labels("history").inc()
+        await edit_message(message, content="An unexpected error occurred while fetching match history.")
 
-def clean_name(text):
-    """ Removes numbers at the start and extra spaces from names """
-    return re.sub(r"^\d+", "", text).strip()
+def dedupe_names(names: list) -> list:
+    """
+    Drop names read more than once, ignoring case. Names that are only similar
+    are kept, they may well be different players.
+    """
+    seen = set()
+    unique = []
+    for name in names:
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            unique.append(name)
+    return unique
 
-def extract_names_from_image(image_data):
-    """ Extract player names from a leaderboard image using strict OCR filtering. """
-    image = np.array(Image.open(io.BytesIO(image_data)).convert("RGB"))
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-    extracted_text = reader.readtext(image, detail=0)
-    player_names = [clean_name(line) for line in extracted_text if len(line) > 2]
-    return list(set(player_names))
+async def lookup_leaderboard_player(name: str, others: set = frozenset()) -> tuple[str, discord.Embed | None]:
+    """
+    Look up a single leaderboard name.
+    Only if it isn't found is it corrected to the closest name we've resolved
+    before, in case OCR misread it; never to another name in others (the
+    lower-cased names read from the same image).
+    Returns ("found", embed), ("private", None) or ("not_found", None).
+    """
+    try:
+        try:
+            player = await fetch_player(name, update=False)
+        except PlayerNotFoundException:
+            corrected = bot.api.names.closest(name, OCR_NAME_MATCH_CUTOFF)
+            if corrected is None or corrected.lower() == name.lower() or corrected.lower() in others:
+                raise
+            log.info(f"Leaderboard name {name} not found, trying {corrected}")
+            player = await fetch_player(corrected, update=False)
+        return "found", build_embed(parse_stats(player))
+    except PrivateProfileException:
+        return "private", None
+    except (PlayerNotFoundException, APIUpdateFailedException):
+        return "not_found", None
+    except Exception:
+        log.exception(f"Leaderboard lookup for {name} failed")
+        ERRORS.labels("leaderboard").inc()
+        return "not_found", None
 
 @bot.hybrid_command(name="leaderboard", description="Get stats for all names in an image.")
 async def leaderboard(ctx):
+    if not OCR_ENABLED:
+        return await send_message(ctx, "Image reading is disabled on this instance, try `r.stats <username>` instead.")
+
     if not ctx.message.attachments:
-        return await ctx.send("Please upload an image of the leaderboard.")
+        return await send_message(ctx, "Please upload an image of the leaderboard.")
 
     attachment = ctx.message.attachments[0]
     
     if not attachment.content_type.startswith("image/"):
-        return await ctx.send("Please upload a valid image file.")
+        return await send_message(ctx, "Please upload a valid image file.")
 
     image_data = await attachment.read()
 
-    player_names = extract_names_from_image(image_data)
+    try:
+        with STAGE_SECONDS.labels("ocr").time():
+            player_names = await bot.get_ocr().extract_names(image_data)
+    except OCRBusyException:
+        return await send_message(ctx, "Too many images are being read right now, please try again in a moment.")
+    except OCRTimeoutException:
+        return await send_message(ctx, "Reading the image took too long, please try a smaller screenshot.")
+    except OCRWorkerCrashException:
+        return await send_message(ctx, "Something went wrong while reading the image, please try again.")
+    player_names = dedupe_names(player_names)
 
     if not player_names:
-        return await ctx.send("No valid player names detected in the image.")
+        return await send_message(ctx, "No valid player names detected in the image.")
+
+    detected = f"Detected Players: {', '.join(player_names)}"
+    view = CancelView(ctx.author.id)
+    status = StatusMessage(await send_message(ctx, f"{detected}\nFetching stats... {progress_bar(0, len(player_names))}", view=view))
+
+    # Look every name up concurrently and post each player as soon as they're ready
+    semaphore = asyncio.Semaphore(LEADERBOARD_CONCURRENCY)
+    read = {name.lower() for name in player_names}
+    async def limited_lookup(name):
+        async with semaphore:
+            return name, await lookup_leaderboard_player(name, read)
+    view.tasks = [asyncio.ensure_future(limited_lookup(name)) for name in player_names]
 
-    await ctx.send(f"Detected Players: {', '.join(player_names)}\nFetching stats...")
-    
     not_found = []
     private_profiles = []
-    successful_embeds = []
-
-    async with httpx.AsyncClient() as client:
-        for name in player_names:
-            response = await client.get(f"https://mrapi.org/api/player-id/{name}")
-            if response.status_code == 200:
-                data = orjson.loads(response.content)
-                if data['id'] is None or data['name'].lower() != name.lower():
-                    not_found.append(name)
-                    continue
-                userID = data['id']
-                response2 = await client.get(f"https://mrapi.org/api/player/{userID}")
-                if response2.status_code == 200:
-                    data2 = orjson.loads(response2.content)
-                    try:
-                        results = parse_stats(data2)
-                        embed = build_embed(results)
-                        successful_embeds.append(embed)
-                    except PrivateProfileException as e:
-                        if e:
-                            rank_tier = ''.join(filter(str.isalpha, str(e)))
-                            rank_icon = RANK_ICONS.get(rank_tier, "")
-                            desc = f"🔒 This profile is set to private.\n**Rank:** {e} {rank_icon}"
-                        else:
-                            desc = "🔒 This profile is set to private."
-                        embed = discord.Embed(
-                            title=f"🔒 {name}'s stats",
-                            description=desc,
-                            colour=0xff0000,
-                            timestamp=datetime.now()
-                        )
-                        private_profiles.append(name)
-                    except APIUpdateFailedException:
-                        not_found.append(name)
-                    except Exception as e:
-                        print(e)
-                        not_found.append(name)
-                else:
-                    not_found.append(name)
+    ready = []
+    more_ready = asyncio.Event()
+    all_done = False
+    async def send_ready():
+        # One send at a time; players finishing while it's in flight go out together
+        # in the next one, so a 12 player image still takes only a few messages
+        while True:
+            await more_ready.wait()
+            more_ready.clear()
+            while ready:
+                batch = batch_embeds(ready)[0]
+                del ready[:len(batch)]
+                await send_message(ctx, embeds=batch)
+            if all_done:
+                return
+    sender = asyncio.ensure_future(send_ready())
+
+    done = 0
+    try:
+        for lookup in asyncio.as_completed(view.tasks):
+            name, (result, embed) = await lookup
+            done += 1
+            if result == "found":
+                ready.append(embed)
+                more_ready.set()
+            elif result == "private":
+                private_profiles.append(name)
             else:
                 not_found.append(name)
+            status.update(content=f"{detected}\nFetching stats... {progress_bar(done, len(player_names))}")
+    except asyncio.CancelledError:
+        if not view.cancelled:
+            sender.cancel()
+            raise
+    except Exception:
+        sender.cancel()
+        raise
+    finally:
+        # Nothing is left running if the command itself fails or is cancelled
+        for task in view.tasks:
+            task.cancel()
+        view.stop()
 
-    if not_found:
-        for name in not_found:
-            await ctx.send(f"Couldn't find user: {name}. Please try here: https://tracker.gg/marvel-rivals/profile/ign/{urllib.parse.quote(name)}/overview")
+    # Players fetched before a cancel are still posted, along with who was missing
+    if not_found or private_profiles:
+        ready.append(build_missing_embed(not_found, private_profiles))
+    all_done = True
+    more_ready.set()
+    await sender
+    if view.cancelled and done < len(player_names):
+        return await status.finish(content=f"{detected}\nCancelled after {done}/{len(player_names)} players.", view=None)
+    await status.finish(content=f"{detected}\nFetched {done}/{len(player_names)} players.", view=None)
 
-    if private_profiles:
-        await ctx.send(f"These profiles are set to private: {', '.join(private_profiles)}")
 
-    for embed in successful_embeds:
-        await ctx.send(embed=embed)
+@bot.hybrid_command(name="trends", description="Get a player's long-term win rate and map stats.")
+@app_commands.autocomplete(name=autocomplete_name)
+async def trends(ctx: commands.Context, *, name: str):
+    """
+    Long-term stats from every match the bot has seen for a player.
+    Usage: r.trends <username>
+    """
+    if bot.matches is None:
+        return await send_message(ctx, "Match storage is disabled on this instance.")
+    log.info(f"Fetching trends for {name}")
+    message = await send_message(ctx, f"Fetching trends for {name}...")
+    try:
+        # Fetching the player stores any matches played since the last lookup
+        user_id = (await bot.api.get_player_id(name))["id"]
+        await fetch_player_by_id(user_id, name)
+        stored = await asyncio.to_thread(bot.matches.trends, user_id)
+        if stored is None:
+            return await edit_message(message, content=f"No matches stored for {name} yet.")
+        await edit_message(message, content=None, embed=build_trends_embed(name, stored))
+    except PlayerNotFoundException:
+        await edit_message(message, content=not_found_message(name))
+    except APIUpdateFailedException:
+        await edit_message(message, content=f"Error updating data for {name}")
+    except Exception:
+        log.exception(f"Fetching trends for {name} failed")
+        ERRORS.labels("trends").inc()
+        await edit_message(message, content="An unexpected error occurred while fetching trends.")
+
+@bot.hybrid_command(name="compare", description="Compare several players side by side.")
+async def compare(ctx: commands.Context, *, names: str):
+    """
+    Compare players' stats in a single embed.
+    Usage: r.compare <username> <username> ... (separate names with commas if they contain spaces)
+    """
+    names = split_names(names)
+    if len(names) < 2:
+        return await send_message(ctx, "Give at least two players to compare, e.g. `r.compare pvc s1natraa`.")
+    if len(names) > COMPARE_MAX_PLAYERS:
+        return await send_message(ctx, f"You can compare at most {COMPARE_MAX_PLAYERS} players at once.")
+    log.info(f"Comparing {', '.join(names)}")
+    message = await send_message(ctx, f"Comparing {', '.join(names)}...")
+
+    # Fetch everyone at once; cached and recently prefetched players cost no API calls
+    semaphore = asyncio.Semaphore(LEADERBOARD_CONCURRENCY)
+    async def limited_fetch(name):
+        async with semaphore:
+            return await fetch_player(name, update=False)
+    results = await asyncio.gather(*(limited_fetch(name) for name in names), return_exceptions=True)
+
+    found = []
+    not_found = []
+    for name, result in zip(names, results):
+        if isinstance(result, Player):
+            found.append((name, result))
+        else:
+            if not isinstance(result, (PlayerNotFoundException, APIUpdateFailedException)):
+                log.error(f"Comparing {name} failed", exc_info=result)
+                ERRORS.labels("compare").inc()
+            not_found.append(name)
+
+    if not found:
+        return await edit_message(message, content="None of these players could be found.")
+    embed = build_compare_embed(compare_players(found), not_found)
+    await edit_message(message, content=None, embed=embed)
 
-      
 @bot.hybrid_command(name="help", description="Show help information for commands.")
 async def help(ctx: commands.Context):
     embed = discord.Embed(
@@ -599,6 +2968,18 @@ async def help(ctx: commands.Context):
         inline=True
     )
 
+    embed.add_field(
+        name="r.compare <username> <username> ...",
+        value="Compare several players side by side.",
+        inline=True
+    )
+
+    embed.add_field(
+        name="r.trends <username>",
+        value="Get a player's long-term win rate and map stats.",
+        inline=True
+    )
+
         
     embed.set_footer(
         text="Powered by RivalsX",
@@ -606,15 +2987,17 @@ async def help(ctx: commands.Context):
     )
 
         
-    await ctx.send(embed=embed)
+    await send_message(ctx, embed=embed)
     
 @bot.event
 async def on_message(message: discord.Message):
     if bot.user.mentioned_in(message):
-        await message.channel.send("I'm online! Run `r.help` to see available commands.")
+        await send_message(message.channel, "I'm online! Run `r.help` to see available commands.")
     await bot.process_commands(message)
 
       
-load_dotenv()
-TOKEN = os.getenv('DISCORD_TOKEN')
-bot.run(TOKEN)
\ No newline at end of file
+# OCR workers are spawned processes that re-import this module, so only start the bot when run directly
+if __name__ == "__main__":
+    TOKEN = os.getenv('DISCORD_TOKEN')
+    # Logging is already set up by metrics.setup_logging
+    bot.run(TOKEN, log_handler=None)
\ No newline at end of file
@@ -0,0 +1,271 @@
+import time
+import bisect
+import functools
+import logging
+import contextvars
+import orjson
+from aiohttp import web
+
+# Lightweight Prometheus-style metrics, rendered in the text exposition format.
+# Updating a metric is a dict lookup and an addition, cheap enough for hot paths.
+# Nothing is locked, so only update metrics from the event loop thread.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Id of the command being handled, added to every log line. Tasks started while
+# handling a command inherit it.
+request_id = contextvars.ContextVar("request_id", default="-")
+
+REGISTRY = []
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def track(self) -> "_Tracker":
+        """
+        Context manager that counts what's running inside it.
+        """
+        return _Tracker(self)
+
+
+class _Tracker:
+    __slots__ = ("gauge",)
+
+    def __init__(self, gauge: _Value):
+        self.gauge = gauge
+
+    def __enter__(self):
+        self.gauge.value += 1
+
+    def __exit__(self, *exc_info):
+        self.gauge.value -= 1
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # One extra slot for values above the last bound (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        """
+        Context manager that observes how long its body took, in seconds.
+        """
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: _Buckets):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """
+    A named metric with optional labels. metric.labels("a", "b") returns the
+    child for those label values; a metric without labels is used directly.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple | list = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def track(self) -> _Tracker:
+        return self.labels().track()
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{self._label_text(values)} {child.value!r}")
+
+
+class Counter(Metric):
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple | list = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {child.count}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {child.sum!r}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {child.count}")
+
+
+def timed(histogram):
+    """
+    Decorator that observes how long every call of a function takes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render() -> str:
+    """
+    Every registered metric in the Prometheus text format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        metric.render(lines)
+    return "\n".join(lines) + "\n"
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    """
+    Serve the metrics on http://host:port/metrics. Call cleanup() on the
+    returned runner to stop.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            body=render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the current request id to every log record.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log collectors.
+    """
+    def __init__(self, label: str | None = None):
+        super().__init__()
+        self.label = label
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if self.label:
+            entry["process"] = self.label
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+def setup_logging(level: str = "INFO", json_format: bool = False, label: str | None = None):
+    """
+    Log to stderr with the request id on every line, as text or as JSON.
+    label tells apart processes logging to the same place, e.g. launcher.py's workers.
+    """
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if json_format:
+        handler.setFormatter(JSONFormatter(label))
+    else:
+        prefix = f"({label}) " if label else ""
+        handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s {prefix}%(name)s [%(request_id)s] %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
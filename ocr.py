@@ -0,0 +1,197 @@
+import io
+import re
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# torch, easyocr and OpenCV are only imported inside the worker processes,
+# so the bot itself stays light even when OCR is enabled.
+
+OCR_LANGUAGES = ["en", "de", "es", "sv", "fr"]
+
+# Screenshots are downscaled to this width before OCR, names stay readable
+OCR_MAX_WIDTH = 1600
+# Most boxes recognised in one batch, bounds worker memory on huge images
+OCR_BATCH_SIZE = 16
+# A usable player name: 3-20 word characters, dots, dashes or spaces, with at least one letter
+NAME_PATTERN = re.compile(r"^(?=.*[^\W\d_])[\w .\-]{3,20}$")
+
+# Each worker process loads its own reader once, in init_worker
+reader = None
+
+
+class OCRBusyException(Exception):
+    """Raised when the OCR job queue is full."""
+    pass
+
+class OCRTimeoutException(Exception):
+    """Raised when an OCR job takes longer than the configured timeout."""
+    pass
+
+class OCRWorkerCrashException(Exception):
+    """Raised when an OCR worker process died while reading an image."""
+    pass
+
+
+def init_worker(languages: list):
+    global reader
+    import easyocr
+    reader = easyocr.Reader(languages, gpu=False)
+
+def ping():
+    """ No-op job, used to make the pool start its workers ahead of time. """
+    return reader is not None
+
+def clean_name(text):
+    """ Removes numbers at the start and extra spaces from names """
+    return re.sub(r"^\d+", "", text).strip()
+
+def load_image(image_data):
+    """ Decode an image to grayscale, downscaled to at most OCR_MAX_WIDTH wide. """
+    import cv2
+    import numpy as np
+    from PIL import Image
+    image = np.array(Image.open(io.BytesIO(image_data)).convert("L"))
+    height, width = image.shape
+    if width > OCR_MAX_WIDTH:
+        scale = OCR_MAX_WIDTH / width
+        image = cv2.resize(image, (OCR_MAX_WIDTH, int(height * scale)), interpolation=cv2.INTER_AREA)
+    return image
+
+def find_name_boxes(gray):
+    """
+    Find the text boxes of the scoreboard's name column.
+    Returns boxes as [x_min, x_max, y_min, y_max] from top to bottom, or None if
+    no column could be found.
+    """
+    import cv2
+    height, width = gray.shape
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Text has to be white on black for the dilation below
+    if cv2.countNonZero(binary) > binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    # Smear the letters of each name together so every name becomes one blob
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 80), 3))
+    blobs = cv2.dilate(binary, kernel, iterations=1)
+    contours, _ = cv2.findContours(blobs, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if height * 0.01 <= h <= height * 0.08 and w >= h * 2:
+            boxes.append((x, y, w, h))
+
+    # Boxes starting at (roughly) the same x form a left-aligned column
+    columns = []
+    tolerance = max(4, width // 100)
+    for box in sorted(boxes):
+        if columns and box[0] - columns[-1][-1][0] <= tolerance:
+            columns[-1].append(box)
+        else:
+            columns.append([box])
+
+    # The name column is the one with the most rows of wide text
+    def score(column):
+        widths = sorted(box[2] for box in column)
+        return len(column) * widths[len(widths) // 2]
+    candidates = [column for column in columns if len(column) >= 3]
+    if not candidates:
+        return None
+    best = max(candidates, key=score)
+
+    pad = 4
+    return [
+        [max(0, x - pad), min(width, x + w + pad), max(0, y - pad), min(height, y + h + pad)]
+        for x, y, w, h in sorted(best, key=lambda box: box[1])
+    ]
+
+def extract_names_from_image(image_data):
+    """
+    Extract player names from a leaderboard image.
+    Only the crops of the scoreboard's name column are recognised, the whole
+    image is only read when no column can be found. Lines that can't be a
+    player name are dropped.
+    """
+    gray = load_image(image_data)
+    boxes = find_name_boxes(gray)
+    if boxes:
+        extracted_text = reader.recognize(
+            gray, horizontal_list=boxes, free_list=[], detail=0,
+            batch_size=min(len(boxes), OCR_BATCH_SIZE),
+        )
+    else:
+        extracted_text = reader.readtext(gray, detail=0)
+    player_names = (clean_name(line) for line in extracted_text)
+    return list(dict.fromkeys(name for name in player_names if NAME_PATTERN.match(name)))
+
+class OCRPool:
+    """
+    Runs OCR in a pool of worker processes so inference never blocks the event loop.
+    At most queue_size jobs are accepted at once (running + waiting), anything
+    beyond that is rejected with OCRBusyException.
+    A job that exceeds the timeout is reported as failed; the worker finishes it
+    in the background since processes in the pool can't be interrupted, and it
+    keeps counting towards queue_size until it does.
+    If a worker dies (e.g. killed for running out of memory) the pool is broken
+    for good, so it is replaced with a fresh one.
+    """
+    def __init__(self, workers: int, queue_size: int, timeout: float, languages: list = OCR_LANGUAGES):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.languages = languages
+        self.pending = 0
+        self.executor = self.create_executor()
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        # spawn so workers never inherit the bot's event loop or threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.languages,),
+        )
+
+    async def warm_up(self):
+        """
+        Start every worker now instead of on the first image.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, ping) for _ in range(self.workers)
+        ))
+
+    async def extract_names(self, image_data: bytes) -> list:
+        if self.pending >= self.queue_size:
+            raise OCRBusyException(f"{self.pending} OCR jobs already queued.")
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            job = executor.submit(extract_names_from_image, image_data)
+            self.pending += 1
+            job.add_done_callback(functools.partial(self._job_done, loop))
+            return await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            raise OCRTimeoutException(f"OCR took longer than {self.timeout}s.")
+        except BrokenProcessPool:
+            # Every job queued on the broken pool fails, only the first one replaces it
+            if self.executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.create_executor()
+            raise OCRWorkerCrashException("An OCR worker process died.")
+
+    def _job_done(self, loop: asyncio.AbstractEventLoop, job):
+        # Called from the executor's thread once the worker is really done with the job
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The event loop is already closed, nothing left to count
+            pass
+
+    def _release(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)